@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+import urllib.request
+from datetime import date, datetime, timedelta
+
+from config import parse_config
+from metrics import percentile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BROWSER_MODULES = ["selenium", "seleniumwire", "pynput", "keystroke_recorder"]
+
+# Runs in a fresh interpreter inside a temp dir holding a cached auth_token.json
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+auth = main.Authenticate(first_name="John", last_name="Doe", dob="01/01/2000", last_4_ssn="9999")
+if {reauth!r}:
+    # Everything _authenticate imports before it launches Chrome
+    from selenium.webdriver.common.by import By
+    from seleniumwire import webdriver
+    import keystroke_recorder
+elapsed = time.perf_counter() - start
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":  # bytes on macOS, KiB on Linux
+    maxrss //= 1024
+print(json.dumps({{
+    "seconds": elapsed,
+    "maxrss_kib": maxrss,
+    "browser_modules": sorted(m for m in {browser_modules!r} if m in sys.modules),
+}}))
+"""
+
+
+def run_startup(reauth):
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "auth_token.json"), "w") as f:
+            json.dump({"auth_token": "Bearer benchmark"}, f)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+        script = STARTUP_SCRIPT.format(reauth=reauth, browser_modules=BROWSER_MODULES)
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=tmp, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def startup_benchmark(args):
+    """Compare import time and peak RSS of the cached-token path against the re-auth path."""
+    failed = False
+    for name, reauth in [("cached-token", False), ("re-auth", True)]:
+        runs = [run_startup(reauth) for _ in range(args.repeat)]
+        seconds = statistics.median(r["seconds"] for r in runs)
+        maxrss = statistics.median(r["maxrss_kib"] for r in runs)
+        print(f"{name:>12}: import {seconds * 1000:8.1f} ms  peak RSS {maxrss / 1024:7.1f} MiB")
+        if not reauth and runs[0]["browser_modules"]:
+            print(f"  cached-token path imported the browser stack: {', '.join(runs[0]['browser_modules'])}")
+            failed = True
+    return 1 if failed else 0
+
+
+def start_mock_server(*server_args):
+    """Start mock_server.py on a free port in a subprocess, so its allocations and CPU stay out of the numbers."""
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "mock_server.py"), "--port", "0", *server_args],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return server, server.stdout.readline().strip()
+
+
+def mock_stats(api_url):
+    with urllib.request.urlopen(api_url.rsplit("/api", 1)[0] + "/mock/stats") as response:
+        return json.load(response)
+
+
+def benchmark_config_data(args, tmp):
+    start, end = date.today(), date.today() + timedelta(days=365)  # Covers every synthetic day
+    start_time, end_time = "08:00", "17:00"  # The synthetic offices' opening hours
+    if getattr(args, "pruned", False):
+        # Before the first synthetic day, so every office's next available date is after it and it is skipped
+        start, end = date(2000, 1, 1), date(2000, 1, 2)
+    elif not args.match:
+        # Outside opening hours: no office is pruned and nothing matches, so every slot of every office is examined
+        start_time, end_time = "18:00", "19:00"
+    data = {
+        "first_name": "John",
+        "last_name": "Doe",
+        "dob": "01/01/2000",
+        "last_4_ssn": "9999",
+        "email": "john.doe@example.com",
+        "date": {"start": start.strftime("%m/%d/%Y"), "end": end.strftime("%m/%d/%Y")},
+        "time": {"start": start_time, "end": end_time},
+        "type_id": 81,
+        "zip_code": 12345,
+        "miles_within": args.miles_within,
+        "location_cache_ttl": args.location_cache_ttl,
+        "prune_by_next_available": not args.location_cache_ttl,  # The cache is only used with pruning off
+        "location_cache_file": os.path.join(tmp, "location_cache.json"),
+        "cycle_lock_file": os.path.join(tmp, "cycle.lock"),
+    }
+    return data
+
+
+def benchmark_config(args, tmp):
+    return parse_config(benchmark_config_data(args, tmp))
+
+
+def cycle_benchmark(args):
+    """Run check-and-book cycles against mock_server.py and report latency, request count and allocations."""
+    import main as dps
+    from dps_client import DpsClient
+    from mock_server import MockAuthenticate
+
+    server_args = ["--locations", str(args.locations), "--days", str(args.days), "--latency", str(args.latency)]
+    if args.token_requests:
+        server_args += ["--token-requests", str(args.token_requests)]
+    if args.hold_failures:
+        server_args += ["--hold-failures", str(args.hold_failures)]
+    server, api_url = start_mock_server(*server_args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config = benchmark_config(args, tmp)
+            auth = MockAuthenticate(api_url.rsplit("/api", 1)[0], token_file=os.path.join(tmp, "auth_token.json"))
+            client = DpsClient(auth, base_url=api_url)
+
+            def run():
+                try:
+                    return dps.run_cycle(config, client).status
+                except Exception as e:
+                    return type(e).__name__
+
+            latencies, request_counts, outcomes = [], [], {}
+            for _ in range(args.cycles):
+                before = client.request_count
+                start = time.perf_counter()
+                outcome = run()
+                latencies.append(time.perf_counter() - start)
+                request_counts.append(client.request_count - before)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+            # Allocations are measured in separate cycles since tracing slows them down
+            peaks = []
+            tracemalloc.start()
+            for _ in range(args.alloc_cycles):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                run()
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            tracemalloc.stop()
+            client.close()
+            stats = mock_stats(api_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"cycles: {args.cycles}  outcomes: {outcomes}  browser logins: {auth.logins}")
+    print(
+        "latency: "
+        + "  ".join(f"p{q} {percentile(latencies, q) * 1000:.1f} ms" for q in (50, 95, 99))
+        + f"  max {max(latencies) * 1000:.1f} ms"
+    )
+    print(f"requests/cycle: mean {statistics.mean(request_counts):.1f}  max {max(request_counts)}")
+    if peaks:
+        median_kib, max_kib = statistics.median(peaks) / 1024, max(peaks) / 1024
+        print(f"peak allocations/cycle: median {median_kib:.0f} KiB  max {max_kib:.0f} KiB")
+    print(f"server requests by endpoint: {stats}")
+    return 0
+
+
+# One process of the concurrency check: log in (or reuse the token file), then run main.py's main() with the
+# mock client, both starting at `start_at` so every worker contends for the locks at once. The process exits
+# with main()'s own status; the last line of output is the cycle's result
+CONCURRENCY_WORKER_SCRIPT = """
+import json, sys, time
+import main as dps
+from config import parse_config
+from dps_client import DpsClient
+from mock_server import MockAuthenticate
+with open("config.json") as f:
+    config = parse_config(json.load(f))
+time.sleep(max(0, {start_at!r} - time.time()))
+auth = MockAuthenticate({base_url!r})
+client = DpsClient(auth, base_url={api_url!r})
+time.sleep(max(0, {start_at!r} + {auth_seconds!r} - time.time()))
+results = []
+run_cycle = dps.run_cycle
+dps.run_cycle = lambda *args, **kwargs: results.append(run_cycle(*args, **kwargs)) or results[-1]
+dps.load_config = lambda: config
+dps.build_client = lambda config: client
+sys.argv = ["main.py"]
+try:
+    dps.main()
+finally:
+    print(json.dumps({{"status": results[-1].status if results else None, "logins": auth.logins}}))
+"""
+
+
+def concurrency_benchmark(args):
+    """Start overlapping main.py processes against mock_server.py and check the run locks.
+
+    All workers start with no saved token, so exactly one should log in and the rest reuse its token;
+    then they start their cycles together, so exactly one should run and book, and the rest should exit
+    busy (BUSY_EXIT_CODE). Exits non-zero if any of that doesn't hold, so it can be run as a test.
+    """
+    import main as dps
+    from runlock import BUSY_EXIT_CODE
+
+    args.match = True  # Every cycle that runs books, so a second booking would show up
+    server, api_url = start_mock_server(
+        "--locations", str(args.locations), "--days", "30", "--latency", str(args.latency)
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "config.json"), "w") as f:
+                json.dump(benchmark_config_data(args, tmp), f)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+            script = CONCURRENCY_WORKER_SCRIPT.format(
+                start_at=time.time() + 2,  # Enough for every interpreter to import before the start
+                auth_seconds=1.0,
+                base_url=api_url.rsplit("/api", 1)[0],
+                api_url=api_url,
+            )
+            workers = [
+                subprocess.Popen([sys.executable, "-c", script], cwd=tmp, env=env, stdout=subprocess.PIPE, text=True)
+                for _ in range(args.processes)
+            ]
+            results = []
+            for worker in workers:
+                output = worker.communicate()[0].strip().splitlines()
+                result = json.loads(output[-1]) if output else {"status": None, "logins": 0}
+                result["exit_code"] = worker.returncode
+                results.append(result)
+            stats = mock_stats(api_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    outcomes = {}
+    for result in results:
+        outcome = f"{result['status']} (exit {result['exit_code']})"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    logins = sum(result["logins"] for result in results)
+    print(f"processes: {args.processes}  outcomes: {outcomes}  logins: {logins}")
+    print(f"server requests by endpoint: {stats}")
+
+    busy = [result for result in results if result["status"] == dps.BUSY]
+    ran = [result for result in results if result["status"] != dps.BUSY]
+    failures = []
+    if logins != 1:
+        failures.append(f"expected 1 login shared by all processes, got {logins}")
+    if stats.get("NewBooking", 0) > 1:
+        failures.append(f"expected at most 1 booking, got {stats['NewBooking']}")
+    if len(ran) != 1 or ran[0]["status"] != dps.BOOKED or ran[0]["exit_code"] != 0:
+        failures.append(f"expected 1 process to book and exit 0, got {len(ran)}: {ran}")
+    if any(result["exit_code"] != BUSY_EXIT_CODE for result in busy):
+        failures.append(f"expected every busy process to exit {BUSY_EXIT_CODE}: {busy}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+def legacy_first_match(locations, dates_by_location, start_date, end_date, start_time, end_time):
+    """The original matching loop: strptime on every slot, first hit in API order."""
+    for location in locations:
+        for date_info in dates_by_location[location.id]:
+            for slot in date_info.slots:
+                slot_dt = datetime.strptime(slot.start_datetime, "%Y-%m-%dT%H:%M:%S")
+                if start_date <= slot_dt.date() <= end_date and start_time <= slot_dt.time() <= end_time:
+                    return slot
+    return None
+
+
+def match_benchmark(args):
+    """Time slot matching over large synthetic AvailableLocationDates payloads."""
+    from dps_client import Location, parse_availability
+    from matcher import SlotMatcher
+    from mock_server import synthetic_fixtures
+
+    fixtures = synthetic_fixtures(args.locations, args.days, args.slots_per_day)
+    locations = [Location(loc["Id"], loc["Name"], loc["Distance"]) for loc in fixtures["locations"]]
+    dates_by_location = {loc.id: parse_availability(fixtures["dates"][str(loc.id)]) for loc in locations}
+    slots = sum(len(day.slots) for dates in dates_by_location.values() for day in dates)
+
+    first_day = date.today() + timedelta(days=1)
+    windows = {
+        "no match": (date(2000, 1, 1), date(2000, 1, 2)),
+        "last week": (first_day + timedelta(days=args.days - 7), first_day + timedelta(days=args.days)),
+        "whole range": (first_day, first_day + timedelta(days=args.days)),
+    }
+    start_time, end_time = datetime.strptime("08:00", "%H:%M").time(), datetime.strptime("12:00", "%H:%M").time()
+    print(f"{len(locations)} locations, {slots} slots")
+    for window, (start_date, end_date) in windows.items():
+        bounds = (start_date, end_date, start_time, end_time)
+        timings = {"legacy first match": lambda: legacy_first_match(locations, dates_by_location, *bounds)}
+        for ranking in ("closest", "earliest"):
+            matcher = SlotMatcher(start_date, end_date, start_time, end_time, ranking=ranking)
+
+            def run(matcher=matcher):
+                search = matcher.search()
+                for location in matcher.order(locations):
+                    search.consider(location, dates_by_location[location.id])
+                    if search.done():
+                        break
+                return search.best
+
+            timings[f"matcher ({ranking})"] = run
+        for name, fn in timings.items():
+            seconds = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+            print(f"{window:>12} | {name:<20} {seconds * 1000:9.3f} ms")
+    return 0
+
+
+def recording_benchmark(args):
+    """Load time and peak allocations of a long keystroke recording, JSON against binary."""
+    import random
+
+    from recording import load_recording, save_recording
+
+    keys = ["a", "b", "c", "1", "2", "Key.tab", "Key.shift", "Key.enter"]
+    events = [{"k": random.choice(keys), "dt": random.uniform(0.05, 0.4)} for _ in range(args.events)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("recording.json", "recording.krec"):
+            path = os.path.join(tmp, name)
+            save_recording(path, events)
+
+            def replay(path=path):  # Everything replay does except sending the keys
+                for e in load_recording(path):
+                    e["k"], float(e.get("dt", 0))
+
+            seconds = min(timeit.repeat(replay, number=1, repeat=args.repeat))
+            tracemalloc.start()
+            replay()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"{name:<15} {os.path.getsize(path) / 1024:9.1f} KiB on disk  {seconds * 1000:8.2f} ms  "
+                f"{peak / 1024:9.1f} KiB peak allocations"
+            )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the polling path.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = subparsers.add_parser("startup", help="Import time and peak RSS of a cycle's startup.")
+    startup.add_argument("--repeat", type=int, default=5, help="Runs per path (median is reported)")
+    startup.set_defaults(func=startup_benchmark)
+
+    cycle = subparsers.add_parser("cycle", help="Latency, requests and allocations per cycle against mock_server.py.")
+    cycle.add_argument("--cycles", type=int, default=50)
+    cycle.add_argument("--alloc-cycles", type=int, default=5, help="Extra cycles run under tracemalloc")
+    cycle.add_argument("--locations", type=int, default=20, help="Synthetic offices")
+    cycle.add_argument("--days", type=int, default=60, help="Synthetic days of availability per office")
+    cycle.add_argument("--miles-within", type=float, default=50)
+    cycle.add_argument(
+        "--location-cache-ttl",
+        type=float,
+        default=0,
+        help="Minutes; above 0 turns pruning off and uses the office cache",
+    )
+    cycle.add_argument("--match", action="store_true", help="Use a date window that matches, so cycles book")
+    cycle.add_argument(
+        "--pruned", action="store_true", help="Use a date window before the fixtures, so every office is pruned"
+    )
+    cycle.add_argument("--token-requests", type=int, help="Mock server rejects a token after this many requests")
+    cycle.add_argument("--hold-failures", type=int, default=0, help="Mock server fails this many HoldSlot calls")
+    cycle.add_argument("--latency", type=float, default=0.0, help="Seconds of delay per mock response")
+    cycle.set_defaults(func=cycle_benchmark)
+
+    match = subparsers.add_parser("match", help="Slot matching speed on large synthetic payloads.")
+    match.add_argument("--locations", type=int, default=50)
+    match.add_argument("--days", type=int, default=120)
+    match.add_argument("--slots-per-day", type=int, default=24)
+    match.add_argument("--number", type=int, default=5, help="Passes per timing")
+    match.set_defaults(func=match_benchmark)
+
+    recording = subparsers.add_parser("recording", help="Keystroke recording load time and memory by format.")
+    recording.add_argument("--events", type=int, default=20000, help="Key events in the synthetic recording")
+    recording.add_argument("--repeat", type=int, default=5)
+    recording.set_defaults(func=recording_benchmark)
+
+    concurrency = subparsers.add_parser(
+        "concurrency", help="Overlapping processes against mock_server.py: one login and one cycle at a time."
+    )
+    concurrency.add_argument("--processes", type=int, default=4)
+    concurrency.add_argument("--locations", type=int, default=20, help="Synthetic offices")
+    concurrency.add_argument("--miles-within", type=float, default=50)
+    concurrency.add_argument(
+        "--location-cache-ttl",
+        type=float,
+        default=0,
+        help="Minutes; above 0 turns pruning off and uses the office cache",
+    )
+    concurrency.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds of delay per mock response, so cycles overlap"
+    )
+    concurrency.set_defaults(func=concurrency_benchmark)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
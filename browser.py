@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Optional
+
+from fileutil import atomic_write_json
+from runlock import FileLock
+
+LOGIN_URL = "https://public.txdpsscheduler.com"
+ELIGIBILITY_URL = "https://apptapi.txdpsscheduler.com/api/Eligibility"
+# Only API traffic is captured; page assets, scripts and images pass through selenium-wire untouched
+API_SCOPES = [r".*apptapi\.txdpsscheduler\.com.*"]
+# Captured requests (with their bodies) kept in memory, oldest dropped first. Nothing reads them back, since
+# EligibilityWatcher keeps the one request it needs, so only the newest is held until the watcher clears it.
+MAX_STORED_REQUESTS = 1
+# Browser processes of running sessions, by the pid of the Python process that owns them, so a later run
+# can kill what a crashed one left behind
+SESSION_PIDS_FILE = "browser_pids.json"
+WATCHDOG_INTERVAL = 2  # Seconds
+
+# The seleniumwire import is deferred to build_driver, so reaping leftover browsers doesn't load the browser stack
+
+
+def build_driver():
+    from seleniumwire import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    # options.add_argument("--headless")  # Optional: Run in headless mode
+    seleniumwire_options = {
+        "request_storage": "memory",
+        "request_storage_max_size": MAX_STORED_REQUESTS,
+        "ignore_http_methods": ["OPTIONS"],  # CORS preflights never carry the token
+    }
+    driver = webdriver.Chrome(options=options, seleniumwire_options=seleniumwire_options)
+    driver.scopes = API_SCOPES
+    return driver
+
+
+class EligibilityWatcher:
+    """Signals as soon as the browser sends the Eligibility request, i.e. the login went through.
+
+    Installed as selenium-wire's request interceptor, so waiting is event-driven instead of
+    repeatedly scanning `driver.requests`. Create it before the login starts. Once the wait is
+    over, the captured requests and responses are dropped, bodies included.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.request = None
+        self._event = threading.Event()
+        driver.request_interceptor = self._intercept
+
+    def _intercept(self, request):
+        if request.url == ELIGIBILITY_URL and request.headers.get("Authorization"):
+            self.request = request
+            self._event.set()
+
+    @property
+    def auth_token(self) -> Optional[str]:
+        return self.request.headers["Authorization"] if self.request is not None else None
+
+    def wait(self, timeout) -> Optional[Any]:
+        """Block until the Eligibility request is seen or `timeout` seconds pass; return the request or None."""
+        self._event.wait(timeout)
+        try:
+            del self.driver.requests
+        except Exception:  # The browser may already be gone
+            pass
+        return self.request
+
+
+# Process bookkeeping reads /proc, so it only works on Linux. Elsewhere the helpers find nothing and a
+# BrowserSession still guarantees driver.quit(), without the process-tree cleanup or the watchdog.
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def _stat(pid):
+    """(name, state, parent pid, start time) of a running process, or None if it is gone or not visible."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            data = f.read()
+    except OSError:
+        return None
+    name = data[data.index("(") + 1 : data.rindex(")")]
+    fields = data[data.rindex(")") + 2 :].split()
+    if fields[0] in ("Z", "X"):  # Exited, waiting to be reaped by its parent
+        return None
+    return name, fields[0], int(fields[1]), int(fields[19])
+
+
+def _start_time(pid):
+    stat = _stat(pid)
+    return stat[3] if stat is not None else None
+
+
+def _pids():
+    try:
+        return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return []
+
+
+def _rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def process_tree(root):
+    """`root` and all of its running descendants."""
+    children = {}
+    for pid in _pids():
+        stat = _stat(pid)
+        if stat is not None:
+            children.setdefault(stat[2], []).append(pid)
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        if _stat(pid) is not None:
+            tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def kill_processes(pids, timeout=5):
+    """SIGTERM the processes, then SIGKILL whatever is still running after `timeout` seconds."""
+    pids = [pid for pid in pids if _stat(pid) is not None]
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        while pids and time.monotonic() < deadline:
+            pids = [pid for pid in pids if _stat(pid) is not None]
+            if pids:
+                time.sleep(0.1)
+        if not pids:
+            return
+
+
+def _load_registry(path):
+    try:
+        with open(path, "r") as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return registry if isinstance(registry, dict) else {}
+
+
+def _update_registry(path, update):
+    """Apply `update` to the registry and save it, holding its lock so concurrent runs don't lose entries."""
+    with FileLock(path + ".lock"):
+        registry = _load_registry(path)
+        result = update(registry)
+        if registry or os.path.exists(path):
+            atomic_write_json(path, registry)
+    return result
+
+
+def reap_orphans(path=SESSION_PIDS_FILE):
+    """Kill browser processes left behind by sessions whose Python process died, or that failed to close.
+
+    Only processes in the registry are touched, and only while their start time still matches, so a
+    reused pid or another tool's browser is never killed. Returns the count.
+    """
+
+    def take_leftovers(registry):
+        leftovers = set()
+        for owner, entry in list(registry.items()):
+            if owner != str(os.getpid()) and _start_time(int(owner)) == entry.get("owner_start"):
+                continue  # Still running its session
+            for pid, start in entry.get("processes", {}).items():
+                if _start_time(int(pid)) == start:
+                    leftovers.add(int(pid))
+            del registry[owner]
+        return leftovers
+
+    leftovers = _update_registry(path, take_leftovers)
+    if leftovers:
+        logging.warning(f"Killing {len(leftovers)} leftover browser processes")
+        kill_processes(leftovers)
+    return len(leftovers)
+
+
+class BrowserLimitExceeded(Exception):
+    pass
+
+
+class BrowserSession:
+    """One Chrome session that is always torn down, however the code using it exits.
+
+        with BrowserSession(max_memory_mb=2048, max_seconds=600) as session:
+            session.driver.get(LOGIN_URL)
+
+    On entry, browsers leaked by earlier runs are reaped. While it is open, a watchdog thread tracks
+    chromedriver and every Chrome process under it, and kills them if their total RSS or the session's
+    age exceeds the limits; the `with` block then raises BrowserLimitExceeded. On exit, driver.quit()
+    shuts down Chrome and the selenium-wire proxy, and any process that survived it is killed.
+    Resource use is logged and left in `usage`.
+    """
+
+    def __init__(self, max_memory_mb=None, max_seconds=None, registry=SESSION_PIDS_FILE):
+        self.max_memory = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.max_seconds = max_seconds
+        self.registry = registry
+        self.driver = None
+        self.processes = {}  # pid -> start time of every process seen in the session's tree
+        self.limit_exceeded = None
+        self.usage = {}
+        self._peak_rss = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def __enter__(self):
+        reap_orphans(self.registry)
+        self._started = time.monotonic()
+        self.driver = build_driver()
+        try:
+            service = getattr(self.driver, "service", None)
+            self._root = getattr(getattr(service, "process", None), "pid", None)
+            if self._root is not None and _stat(self._root) is not None:
+                self._track()
+                self._watchdog = threading.Thread(target=self._watch, name="browser-watchdog", daemon=True)
+                self._watchdog.start()
+        except BaseException:  # __exit__ won't run, so don't leave the browser behind
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if self.limit_exceeded is not None:
+            raise BrowserLimitExceeded(f"Browser session killed: {self.limit_exceeded}") from exc
+        return False
+
+    def _track(self):
+        """Record the session's current processes and return their total RSS."""
+        with self._lock:
+            tree = process_tree(self._root)
+            new = {pid: _start_time(pid) for pid in tree if pid not in self.processes}
+            self.processes.update((pid, start) for pid, start in new.items() if start is not None)
+            rss = sum(_rss(pid) for pid in tree)
+            self._peak_rss = max(self._peak_rss, rss)
+            if new:
+                self._save_registry()
+        return rss
+
+    def _save_registry(self):
+        owner = os.getpid()
+        entry = {"owner_start": _start_time(owner), "processes": dict(self.processes)} if self.processes else None
+
+        def update(registry):
+            if entry is not None:
+                registry[str(owner)] = entry
+            else:
+                registry.pop(str(owner), None)
+
+        _update_registry(self.registry, update)
+
+    def _watch(self):
+        while not self._stop.wait(WATCHDOG_INTERVAL):
+            rss = self._track()
+            elapsed = time.monotonic() - self._started
+            if self.max_memory and rss > self.max_memory:
+                self.limit_exceeded = f"RSS {rss / 2**20:.0f} MiB over the {self.max_memory / 2**20:.0f} MiB limit"
+            elif self.max_seconds and elapsed > self.max_seconds:
+                self.limit_exceeded = f"open for {elapsed:.0f} s, over the {self.max_seconds:.0f} s limit"
+            else:
+                continue
+            # Killing the processes makes whatever the session's thread is doing with the driver fail fast
+            logging.warning(f"{self.limit_exceeded}; killing the browser")
+            kill_processes(list(self.processes))
+            return
+
+    def close(self):
+        if self.driver is None:
+            return
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._track()  # Chrome's children are reparented once chromedriver exits, so look one last time
+        try:
+            self.driver.quit()
+        except Exception:
+            logging.warning("driver.quit() failed", exc_info=True)
+        survivors = [pid for pid, start in self.processes.items() if _start_time(pid) == start]
+        if survivors:
+            logging.warning(f"Killing {len(survivors)} browser processes still running after quit")
+            kill_processes(survivors)
+        with self._lock:
+            seen = len(self.processes)
+            self.processes = {}
+            self._save_registry()
+        self.usage = {
+            "browser_seconds": round(time.monotonic() - self._started, 1),
+            "browser_peak_rss_mb": round(self._peak_rss / 2**20, 1),
+            "browser_processes": seen,
+            "browser_killed": len(survivors),
+        }
+        self.driver = None
+        logging.info(
+            f"Browser session: {self.usage['browser_seconds']} s, peak RSS {self.usage['browser_peak_rss_mb']} MiB "
+            f"over {self.usage['browser_processes']} processes, {len(survivors)} killed after quit"
+        )
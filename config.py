@@ -0,0 +1,232 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from functools import cached_property
+from typing import Optional, Tuple, Union
+
+import yaml
+
+AUTH_MODES = ("manual", "recorded_keystrokes", "automated_sendkeys")
+RANKINGS = ("closest", "earliest", "preferred")
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Config:
+    """Validated contents of config.yaml, shared by main.py, monitor.py and Authenticate."""
+
+    first_name: str
+    last_name: str
+    dob: str  # mm/dd/yyyy, as the API expects it
+    last_4_ssn: Union[int, str]  # As written in config.yaml, like zip_code; the API gets it unchanged
+    email: str
+    start_date: date
+    end_date: date
+    start_time: time
+    end_time: time
+    type_id: int
+    zip_code: Union[int, str]
+    miles_within: float
+    auth_mode: str = "manual"
+    keystroke_file: str = "login_recording.krec"
+    token_refresh_margin: float = 5  # Minutes
+    browser_max_memory: Optional[float] = 2048  # MiB
+    browser_max_minutes: Optional[float] = 10
+    api_url: Optional[str] = None  # Defaults to the live API; can point at mock_server.py
+    location_cache_ttl: float = 60  # Minutes
+    location_cache_file: str = "location_cache.json"
+    cycle_lock_file: str = "cycle.lock"
+    prune_by_next_available: bool = True
+    ranking: str = "closest"
+    preferred_locations: Tuple[str, ...] = ()
+    metrics_file: Optional[str] = None
+    history_file: Optional[str] = None
+    max_requests_per_hour: Optional[int] = None
+    max_backoff: float = 60  # Minutes
+    notification_urls: Tuple[str, ...] = ()
+    notification_timeout: float = 10
+    notification_retries: int = 2
+    path: Optional[str] = field(default=None, compare=False)
+
+    @cached_property
+    def matcher(self):
+        """Date/time window compiled once per loaded config."""
+        from matcher import SlotMatcher
+
+        return SlotMatcher.from_config(self)
+
+
+def _get(data, errors, key, kind, default=..., parse=None, section=None, optional=False, minimum=None):
+    """Read and check one setting. A missing or empty (null) value means the default, or is an error if there
+    is none; with `optional`, null is kept as None (e.g. to disable a limit)."""
+    present, value = key in data, data.get(key)
+    key = f"{section}.{key}" if section else key  # For error messages
+    if value is None:
+        if default is ...:
+            errors.append(f"{key}: required")
+            return None
+        return None if optional and present else default
+    if parse is not None:
+        try:
+            return parse(value)
+        except (TypeError, ValueError) as e:
+            errors.append(f"{key}: {e}")
+            return None
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        errors.append(f"{key}: expected {kind.__name__}, got {value!r}")
+        return None
+    if minimum is not None and value < minimum:
+        errors.append(f"{key}: must be at least {minimum}, got {value!r}")
+        return None
+    return value
+
+
+def _section(data, errors, key):
+    section = data.get(key) or {}
+    if not isinstance(section, dict):
+        errors.append(f"{key}: expected a mapping, got {section!r}")
+        return {}
+    return section
+
+
+def _date(value):
+    return datetime.strptime(str(value), "%m/%d/%Y").date()
+
+
+def _time(value):
+    return datetime.strptime(str(value), "%H:%M").time()
+
+
+def _dob(value):
+    _date(value)
+    return str(value)
+
+
+def _number_or_string(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"expected a number or string, got {value!r}")
+    return value
+
+
+def _last_4_ssn(value):
+    digits = str(_number_or_string(value))
+    if len(digits) != 4 or not digits.isdigit():
+        raise ValueError(f"expected 4 digits, got {value!r} (quote it if it starts with 0)")
+    return value
+
+
+def _choice(choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}, got {value!r}")
+        return value
+
+    return parse
+
+
+def _strings(value):
+    if not isinstance(value, list):
+        raise ValueError(f"expected a list, got {value!r}")
+    return tuple(str(item) for item in value if item)
+
+
+def parse_config(data, path=None) -> Config:
+    """Validate a parsed config.yaml, reporting every problem at once."""
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path or 'config'}: expected a mapping at the top level")
+    errors = []
+    date_range = _section(data, errors, "date")
+    time_range = _section(data, errors, "time")
+    schedule = _section(data, errors, "schedule")
+    notifications = _section(data, errors, "notifications")
+    browser = _section(data, errors, "browser")
+
+    values = dict(
+        first_name=_get(data, errors, "first_name", str),
+        last_name=_get(data, errors, "last_name", str),
+        dob=_get(data, errors, "dob", str, parse=_dob),
+        last_4_ssn=_get(data, errors, "last_4_ssn", str, parse=_last_4_ssn),
+        email=_get(data, errors, "email", str),
+        start_date=_get(date_range, errors, "start", date, parse=_date, section="date"),
+        end_date=_get(date_range, errors, "end", date, parse=_date, section="date"),
+        start_time=_get(time_range, errors, "start", time, parse=_time, section="time"),
+        end_time=_get(time_range, errors, "end", time, parse=_time, section="time"),
+        type_id=_get(data, errors, "type_id", int),
+        zip_code=_get(data, errors, "zip_code", str, parse=_number_or_string),
+        miles_within=_get(data, errors, "miles_within", float, minimum=0),
+        auth_mode=_get(data, errors, "auth_mode", str, "manual", parse=_choice(AUTH_MODES)),
+        keystroke_file=_get(data, errors, "keystroke_file", str, "login_recording.krec"),
+        token_refresh_margin=_get(data, errors, "token_refresh_margin", float, 5, minimum=0),
+        browser_max_memory=_get(
+            browser, errors, "max_memory", float, 2048, section="browser", optional=True, minimum=0
+        ),
+        browser_max_minutes=_get(
+            browser, errors, "max_minutes", float, 10, section="browser", optional=True, minimum=0
+        ),
+        api_url=_get(data, errors, "api_url", str, None),
+        location_cache_ttl=_get(data, errors, "location_cache_ttl", float, 60, minimum=0),
+        location_cache_file=_get(data, errors, "location_cache_file", str, "location_cache.json"),
+        cycle_lock_file=_get(data, errors, "cycle_lock_file", str, "cycle.lock"),
+        prune_by_next_available=_get(data, errors, "prune_by_next_available", bool, True),
+        ranking=_get(data, errors, "ranking", str, "closest", parse=_choice(RANKINGS)),
+        preferred_locations=_get(data, errors, "preferred_locations", tuple, (), parse=_strings),
+        metrics_file=_get(data, errors, "metrics_file", str, None),
+        history_file=_get(data, errors, "history_file", str, None),
+        max_requests_per_hour=_get(
+            schedule, errors, "max_requests_per_hour", int, None, section="schedule", minimum=1
+        ),
+        max_backoff=_get(schedule, errors, "max_backoff", float, 60, section="schedule", minimum=0),
+        notification_urls=_get(notifications, errors, "urls", tuple, (), parse=_strings, section="notifications"),
+        notification_timeout=_get(notifications, errors, "timeout", float, 10, section="notifications", minimum=0),
+        notification_retries=_get(notifications, errors, "retries", int, 2, section="notifications", minimum=0),
+    )
+    if values["start_date"] and values["end_date"] and values["end_date"] < values["start_date"]:
+        errors.append("date: end is before start")
+    if values["start_time"] and values["end_time"] and values["end_time"] < values["start_time"]:
+        errors.append("time: end is before start")
+    if errors:
+        raise ConfigError(f"Invalid {path or 'config'}:\n  " + "\n  ".join(errors))
+    return Config(path=path, **values)
+
+
+def load_config(path="config.yaml") -> Config:
+    try:
+        with open(path, "r") as file:
+            data = yaml.safe_load(file)
+    except FileNotFoundError:
+        raise ConfigError(f"{path} not found. Copy config.example.yaml to {path} and fill it in.")
+    except yaml.YAMLError as e:
+        raise ConfigError(f"{path} is not valid YAML: {e}")
+    return parse_config(data, path)
+
+
+class ConfigWatcher:
+    """Holds the current config and reloads it when the file changes; an invalid edit keeps the old one."""
+
+    def __init__(self, path="config.yaml"):
+        self.path = path
+        self._mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        self.config = load_config(path)
+
+    def poll(self) -> bool:
+        """Reload if the file changed since the last check; return True if a new config is in effect."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            self.config = load_config(self.path)
+        except ConfigError as e:
+            logging.error(f"Keeping the previous config: {e}")
+            return False
+        logging.info(f"Reloaded {self.path}")
+        return True
@@ -0,0 +1,238 @@
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from fingerprints import BASE_HEADERS
+from metrics import tracer
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+API_URL = "https://apptapi.txdpsscheduler.com/api"
+
+# (connect, read) timeouts in seconds for each endpoint
+TIMEOUTS = {
+    "Booking": (5, 20),
+    "AvailableLocation": (5, 20),
+    "AvailableLocationDates": (5, 20),
+    "HoldSlot": (5, 20),
+    "Eligibility": (5, 20),
+    "NewBooking": (5, 30),
+}
+# Lookups are safe to resend; HoldSlot/Eligibility/NewBooking are only retried if the connection never opened
+READ_ONLY_ENDPOINTS = ["Booking", "AvailableLocation", "AvailableLocationDates"]
+REAUTH_STATUS_CODES = (401, 403)
+
+
+class DpsApiError(Exception):
+    def __init__(self, endpoint, status_code, headers=None, body=""):
+        super().__init__(f"{endpoint} request failed with status {status_code}: {body[:200]}")
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@dataclass
+class Booking:
+    booking_datetime: str  # 2024-10-21T15:20:00
+
+
+@dataclass
+class Location:
+    id: int
+    name: str
+    distance: float
+    next_available: Optional[str] = None  # 2024-10-21, from the AvailableLocation summary if present
+
+
+@dataclass
+class Slot:
+    slot_id: int
+    start_datetime: str  # 2024-10-21T15:20:00
+
+
+@dataclass
+class AvailabilityDate:
+    date: Optional[str]  # 2024-10-21T00:00:00, if the API reports it
+    slots: List[Slot]
+
+
+def parse_next_available(value) -> Optional[str]:
+    """Normalize AvailableLocation's NextAvailableDate (10/21/2024 or 2024-10-21T00:00:00) to 2024-10-21."""
+    if not value:
+        return None
+    try:
+        if "/" in value:
+            return datetime.strptime(value, "%m/%d/%Y").date().isoformat()
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_availability(timeslots) -> List[AvailabilityDate]:
+    """Convert an AvailableLocationDates response into AvailabilityDate objects."""
+    return [
+        AvailabilityDate(
+            day.get("AvailabilityDate"),
+            [Slot(s["SlotId"], s["StartDateTime"]) for s in day["AvailableTimeSlots"]],
+        )
+        for day in timeslots["LocationAvailabilityDates"]
+    ]
+
+
+class NoThrottleRetry(Retry):
+    """Retry that never resends a response carrying Retry-After (429, 503 when throttled).
+
+    Those go straight back as DpsApiError so the poll scheduler waits them out between cycles,
+    instead of the adapter sleeping inside one request and resending to a server throttling us.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if has_retry_after:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class DpsClient:
+    """DPS scheduler API client on one pooled keep-alive session, with per-endpoint timeouts and
+    a single shared re-authentication on 401/403."""
+
+    def __init__(self, auth, base_url=API_URL, timeouts=None):
+        self.auth = auth
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self._reauth_lock = threading.Lock()
+        self.request_count = 0  # Requests sent over this client's lifetime, for rate budgeting
+
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(BASE_HEADERS)
+        connect_only = NoThrottleRetry(
+            total=2, connect=2, read=0, status=0, backoff_factor=0.5, respect_retry_after_header=False
+        )
+        read_only = NoThrottleRetry(
+            total=2,
+            connect=2,
+            read=2,
+            status=2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=["POST"],
+            backoff_factor=0.5,
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        self.session.mount(self.base_url, HTTPAdapter(pool_maxsize=4, max_retries=connect_only))
+        for endpoint in READ_ONLY_ENDPOINTS:
+            self.session.mount(f"{self.base_url}/{endpoint}", HTTPAdapter(pool_maxsize=4, max_retries=read_only))
+
+    def close(self):
+        self.session.close()
+
+    def _reauthenticate(self, stale_token):
+        # Concurrent callers that saw the same stale token wait here and reuse the first caller's new token
+        with self._reauth_lock:
+            if self.auth.auth_token == stale_token:
+                self.auth.token_rejected()
+                self.auth.get_headers(reauth=True)
+
+    def _post(self, endpoint, payload, **span_attrs) -> Any:
+        url = f"{self.base_url}/{endpoint}"
+        for attempt in range(2):
+            token = self.auth.auth_token
+            self.request_count += 1
+            with tracer.span(endpoint, attempt=attempt, **span_attrs) as span:
+                response = self.session.post(
+                    url, json=payload, headers={"Authorization": token}, timeout=self.timeouts[endpoint]
+                )
+                span["status"] = response.status_code
+                span["bytes"] = len(response.content)
+            # Resends by the adapter's Retry are requests too, for the hourly budget
+            retries = getattr(response.raw, "retries", None)
+            if retries is not None:
+                self.request_count += len(retries.history)
+            if response.status_code in REAUTH_STATUS_CODES and attempt == 0:
+                self._reauthenticate(token)
+                continue
+            break
+        if response.status_code != 200:
+            raise DpsApiError(endpoint, response.status_code, response.headers, response.text)
+        self.auth.token_accepted()
+        return response.json()
+
+    def bookings(self, first_name, last_name, dob, last_4_ssn) -> List[Booking]:
+        payload = {
+            "FirstName": first_name,
+            "LastName": last_name,
+            "DateOfBirth": dob,
+            "LastFourDigitsSsn": last_4_ssn,
+        }
+        return [Booking(b["BookingDateTime"]) for b in self._post("Booking", payload)]
+
+    def available_locations(self, type_id, zip_code) -> List[Location]:
+        payload = {
+            "TypeId": type_id,
+            "ZipCode": zip_code,
+            "CityName": "",
+            "PreferredDay": 0,
+        }
+        return [
+            Location(loc["Id"], loc["Name"], loc["Distance"], parse_next_available(loc.get("NextAvailableDate")))
+            for loc in self._post("AvailableLocation", payload)
+        ]
+
+    def available_dates(self, location_id, type_id) -> List[AvailabilityDate]:
+        payload = {
+            "LocationId": location_id,
+            "TypeId": type_id,
+            "SameDay": False,
+            "StartDate": None,
+            "PreferredDay": 0,
+        }
+        return parse_availability(self._post("AvailableLocationDates", payload, location_id=location_id))
+
+    def hold_slot(self, slot_id, first_name, last_name, dob, last_4_ssn) -> bool:
+        payload = {
+            "SlotId": slot_id,
+            "FirstName": first_name,
+            "LastName": last_name,
+            "DateOfBirth": dob,
+            "Last4Ssn": last_4_ssn,
+        }
+        return bool(self._post("HoldSlot", payload)["SlotHeldSuccessfully"])
+
+    def eligibility(self, first_name, last_name, dob, last_4_ssn) -> str:
+        payload = {
+            "FirstName": first_name,
+            "LastName": last_name,
+            "DateOfBirth": dob,
+            "LastFourDigitsSsn": last_4_ssn,
+            "CardNumber": "",
+        }
+        return self._post("Eligibility", payload)[0]["ResponseId"]
+
+    def new_booking(self, slot, location, response_id, first_name, last_name, dob, last_4_ssn, email, type_id):
+        payload = {
+            "CardNumber": "",
+            "FirstName": first_name,
+            "LastName": last_name,
+            "DateOfBirth": dob,
+            "Last4Ssn": last_4_ssn,
+            "Email": email,
+            "CellPhone": "",
+            "HomePhone": "",
+            "ServiceTypeId": type_id,
+            "BookingDateTime": slot.start_datetime,
+            "BookingDuration": 20,
+            "SlotId": slot.slot_id,
+            "SpanishLanguage": "N",
+            "SiteId": location.id,
+            "SendSms": False,
+            "AdaRequired": False,
+            "ResponseId": response_id,
+        }
+        return self._post("NewBooking", payload)
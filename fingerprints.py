@@ -1,14 +1,31 @@
-import json
 import os
 import random
 import time
 from typing import Any, Dict, List, Optional
 
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from seleniumwire import webdriver  # Import from seleniumwire
-
-from keystroke_recorder import replay_keystrokes
+from metrics import tracer
+from runlock import FileLock
+from tokens import TokenManager
+
+# The browser stack (selenium, seleniumwire, keystroke_recorder/pynput) is imported lazily inside the
+# login methods, so the cached-token path starts quickly and works on hosts without Chrome or a display.
+
+BASE_HEADERS = {
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+    "Content-Type": "application/json;charset=UTF-8",
+    "DNT": "1",
+    "Origin": "https://public.txdpsscheduler.com",
+    "Referer": "https://public.txdpsscheduler.com/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36",
+    "sec-ch-ua": '"Google Chrome";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"macOS"',
+}
 
 
 def random_sleep():
@@ -17,98 +34,164 @@ def random_sleep():
 
 class Authenticate:
     def __init__(
-        self, first_name, last_name, dob, last_4_ssn, auth_mode="manual", keystroke_file="login_recording.json"
+        self,
+        first_name,
+        last_name,
+        dob,
+        last_4_ssn,
+        auth_mode="manual",
+        keystroke_file="login_recording.krec",
+        browser_max_memory=None,
+        browser_max_minutes=None,
     ):
         self.auth_token = None
         self.token_file = "auth_token.json"
+        self.auth_lock = FileLock(self.token_file + ".lock")
         self.first_name = first_name
         self.last_name = last_name
         self.dob = dob
         self.last_4_ssn = str(last_4_ssn)
         self.auth_mode = auth_mode  # "manual", "recorded_keystrokes", "automated_sendkeys"
         self.keystroke_file = keystroke_file
+        # Limits for each login's browser session (MiB of RSS across Chrome's processes, minutes open)
+        self.browser_max_memory = browser_max_memory
+        self.browser_max_minutes = browser_max_minutes
         self._load_token()
 
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            first_name=config.first_name,
+            last_name=config.last_name,
+            dob=config.dob,
+            last_4_ssn=config.last_4_ssn,
+            auth_mode=config.auth_mode,
+            keystroke_file=config.keystroke_file,
+            browser_max_memory=config.browser_max_memory,
+            browser_max_minutes=config.browser_max_minutes,
+        )
+
     def _load_token(self):
-        if os.path.exists(self.token_file):
-            with open(self.token_file, "r") as file:
-                data = json.load(file)
-                self.auth_token = data.get("auth_token")
+        with tracer.span("token_load"):
+            self.tokens = TokenManager(self.token_file)
+            self.auth_token = self.tokens.token
         if not self.auth_token:
             self._authenticate()
 
     def _save_token(self):
-        with open(self.token_file, "w") as file:
-            json.dump({"auth_token": self.auth_token}, file)
+        self.tokens.set_token(self.auth_token)
+
+    def token_accepted(self):
+        self.tokens.mark_accepted()
+
+    def token_rejected(self):
+        with self.auth_lock:  # Don't overwrite a token another process is saving
+            self.tokens.mark_rejected()
+
+    def refresh_if_expiring(self, within_seconds):
+        """Log in again ahead of time if the token is known to expire within `within_seconds`."""
+        if self.tokens.expires_within(within_seconds):
+            self._authenticate()
+            return True
+        return False
 
     def _authenticate(self):
-        options = webdriver.ChromeOptions()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        # options.add_argument("--headless")  # Optional: Run in headless mode
-        driver = webdriver.Chrome(options=options)
+        """Log in, unless another process has saved a new token in the meantime; then reuse that one.
+
+        Logins are single-flight across processes: whoever holds the lock logs in, and the others wait
+        for it and pick up the token it saved instead of each starting a browser.
+        """
+        stale_token = self.auth_token
+        with self.auth_lock:
+            tokens = TokenManager(self.token_file)
+            self.tokens = tokens
+            if tokens.token and tokens.token != stale_token:
+                print("Reusing the auth token saved by another process.")
+                self.auth_token = tokens.token
+                return
+            self._log_in()
+
+    def _log_in(self):
+        from browser import BrowserSession
+        from recording import load_recording
+
+        events = None
+        if self.auth_mode == "recorded_keystrokes":
+            # Load (and for binary recordings, check the header of) the recording before Chrome is started
+            if not os.path.exists(self.keystroke_file):
+                json_file = os.path.splitext(self.keystroke_file)[0] + ".json"
+                if os.path.exists(json_file):  # Recorded before .krec became the default
+                    hint = f"Convert {json_file} with `python recording.py convert {json_file}`, or set keystroke_file"
+                else:
+                    hint = "Please record keystrokes first using keystroke_recorder.py"
+                raise FileNotFoundError(f"Keystroke file {self.keystroke_file} not found. {hint}")
+            events = load_recording(self.keystroke_file)  # Binary recordings are streamed during replay
+
+        max_seconds = self.browser_max_minutes * 60 if self.browser_max_minutes else None
+        session = BrowserSession(self.browser_max_memory, max_seconds)
+        with tracer.span(f"browser_auth:{self.auth_mode}") as span:
+            try:
+                # The session quits the driver and kills any leftover Chrome process however the login exits
+                with session:
+                    auth_token = self._browser_login(session.driver, events)
+            finally:
+                span.update(session.usage)
+            if auth_token is None:
+                raise Exception("Failed to authenticate")
+
+        self.auth_token = auth_token
+        self._save_token()
+
+    def _browser_login(self, driver, events=None):
+        """Log in with the configured auth mode and return the token from the Eligibility request, or None.
+
+        `events` is the loaded keystroke recording for the recorded_keystrokes mode.
+        """
+        from selenium.webdriver.common.by import By
+
+        from browser import LOGIN_URL, EligibilityWatcher
+        from keystroke_recorder import replay_keystrokes
+
+        watcher = EligibilityWatcher(driver)
 
         # Open the website
-        driver.get("https://public.txdpsscheduler.com")
+        driver.get(LOGIN_URL)
 
         if self.auth_mode == "manual":
             print("Please complete the login process manually in the opened browser window.")
             print("After you have logged in, the script will continue automatically.")
         elif self.auth_mode == "recorded_keystrokes":
-            if os.path.exists(self.keystroke_file):
-                print(f"Replaying recorded keystrokes from {self.keystroke_file}")
-                with open(self.keystroke_file, "r") as f:
-                    data = json.load(f)
-                events = data.get("events", [])
-                try:
-                    body = driver.find_element(By.TAG_NAME, "body")
-                    body.click()  # focus page for typing
-                except Exception:
-                    pass
-                replay_keystrokes(driver, events)
-            else:
-                raise FileNotFoundError(
-                    f"Keystroke file {self.keystroke_file} not found. Please record keystrokes first using keystroke_recorder.py"
-                )
+            print(f"Replaying recorded keystrokes from {self.keystroke_file}")
+            try:
+                body = driver.find_element(By.TAG_NAME, "body")
+                body.click()  # focus page for typing
+            except Exception:
+                pass
+            replay_keystrokes(driver, events)
         elif self.auth_mode == "automated_sendkeys":
             # Use human-like typing with Tab navigation and realistic timing
             self._human_like_login(driver)
 
-        auth_token = None
-        # Extract the auth token from the request
+        # Wait for the eligibility request that carries the auth token
         is_manual = self.auth_mode in ["manual", "recorded_keystrokes"]
-        for _ in range(30 if is_manual else 5):
-            time.sleep(2 if is_manual else 5)
-            try:  # Check if the eligibility request is present
-                eligibility_request = [
-                    request
-                    for request in driver.requests
-                    if request.url == "https://apptapi.txdpsscheduler.com/api/Eligibility"
-                ][0]
-            except:  # If not, recaptcha3 minscore was too low, retry clicking the log on button (only in automated mode)
-                if not is_manual:
-                    random_sleep()
-                    driver.find_elements(By.TAG_NAME, "button")[0].click()  # Ok button
-                    random_sleep()
-                    driver.find_elements(By.TAG_NAME, "button")[-1].click()  # Log on button
-                    continue
-                else:
-                    continue
-
-            auth_token = eligibility_request.headers["Authorization"]
-            break
-
-        # Close the driver
-        driver.quit()
-
-        if auth_token is None:
-            raise Exception("Failed to authenticate")
-
-        self.auth_token = auth_token
-        self._save_token()
+        if is_manual:
+            watcher.wait(60)
+        else:
+            for _ in range(5):
+                if watcher.wait(5):
+                    break
+                # If not, recaptcha3 minscore was too low, retry clicking the log on button
+                random_sleep()
+                driver.find_elements(By.TAG_NAME, "button")[0].click()  # Ok button
+                random_sleep()
+                driver.find_elements(By.TAG_NAME, "button")[-1].click()  # Log on button
+        return watcher.auth_token
 
     def _human_like_login(self, driver):
         """Human-like login using keyboard navigation and natural timing."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+
         try:
             # Focus the page body first (only focusing, not clicking)
             body = driver.find_element(By.TAG_NAME, "body")
@@ -191,22 +274,4 @@ class Authenticate:
         if reauth:
             self._authenticate()
 
-        headers = {
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Authorization": self.auth_token,
-            "Connection": "keep-alive",
-            "Content-Type": "application/json;charset=UTF-8",
-            "DNT": "1",
-            "Origin": "https://public.txdpsscheduler.com",
-            "Referer": "https://public.txdpsscheduler.com/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-site",
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36",
-            "sec-ch-ua": '"Google Chrome";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"macOS"',
-        }
-
-        return headers
+        return dict(BASE_HEADERS, Authorization=self.auth_token)
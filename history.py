@@ -0,0 +1,208 @@
+import argparse
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cycles (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    locations INTEGER NOT NULL,
+    slots INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    cycle_id INTEGER NOT NULL REFERENCES cycles(id),
+    location_id INTEGER NOT NULL,
+    slots INTEGER NOT NULL,
+    first_slot TEXT
+);
+-- Slots currently believed to be open, so appearances and disappearances survive restarts
+CREATE TABLE IF NOT EXISTS live_slots (
+    location_id INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    start TEXT NOT NULL,
+    appeared_at REAL NOT NULL,
+    PRIMARY KEY (location_id, slot_id)
+);
+-- Offices whose open slots are known, i.e. that were queried in the last cycle that listed them, so one last
+-- seen with no open slots isn't taken as new after a restart
+CREATE TABLE IF NOT EXISTS locations_seen (
+    location_id INTEGER PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slot_events (
+    ts REAL NOT NULL,
+    location_id INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    start TEXT NOT NULL,
+    event TEXT NOT NULL  -- 'appeared' or 'vanished'
+);
+CREATE INDEX IF NOT EXISTS slot_events_event_ts ON slot_events (event, ts);
+"""
+
+
+class HistoryStore:
+    """Records every cycle's availability in SQLite from a background thread.
+
+    `record` only enqueues, so the poll path never waits on disk. The writer diffs each location's
+    slots against what it saw last time and stores slots that appeared or vanished; a location's
+    first observation is a baseline and produces no events. So is the first one after a cycle that
+    listed the location without querying it, since whatever changed in between can't be dated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+        self._thread.start()
+
+    def record(self, availability, ts=None):
+        """Queue one cycle's results: {location_id: [AvailabilityDate, ...]}, with None for locations not queried."""
+        snapshot = {
+            location_id: [(slot.slot_id, slot.start_datetime) for day in dates for slot in day.slots]
+            if dates is not None
+            else None
+            for location_id, dates in availability.items()
+        }
+        if self._thread.is_alive():  # Stays empty instead of growing if the database could not be opened
+            self._queue.put((time.time() if ts is None else ts, snapshot))
+
+    def close(self, timeout=10):
+        """Write everything queued and stop the writer."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            db = sqlite3.connect(self.path)
+            tables = {name for (name,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            db.executescript(SCHEMA)
+            if "cycles" in tables and "locations_seen" not in tables:  # Databases from before locations_seen existed
+                with db:
+                    db.execute(
+                        "INSERT INTO locations_seen SELECT o.location_id, MAX(c.ts) "
+                        "FROM observations o JOIN cycles c ON c.id = o.cycle_id GROUP BY o.location_id"
+                    )
+            live = {location_id: {} for (location_id,) in db.execute("SELECT location_id FROM locations_seen")}
+            for location_id, slot_id, start in db.execute("SELECT location_id, slot_id, start FROM live_slots"):
+                live.setdefault(location_id, {})[slot_id] = start
+        except sqlite3.Error:
+            logging.exception(f"Availability history disabled: could not open {self.path}")
+            return
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:  # Write whatever else is already queued in the same transaction
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = batch[: batch.index(None)]
+            try:
+                with db:
+                    for ts, snapshot in batch:
+                        self._write_cycle(db, live, ts, snapshot)
+            except sqlite3.Error:
+                logging.exception("Failed to write availability history")
+        db.close()
+
+    def _write_cycle(self, db, live, ts, snapshot):
+        unobserved = [(location_id,) for location_id, slots in snapshot.items() if slots is None]
+        snapshot = {location_id: slots for location_id, slots in snapshot.items() if slots is not None}
+        cycle_id = db.execute(
+            "INSERT INTO cycles (ts, locations, slots) VALUES (?, ?, ?)",
+            (ts, len(snapshot), sum(len(slots) for slots in snapshot.values())),
+        ).lastrowid
+        observations, events, appeared, vanished = [], [], [], []
+        for (location_id,) in unobserved:  # Its slots are unknown until it is queried again
+            live.pop(location_id, None)
+        for location_id, slots in snapshot.items():
+            current = dict(slots)
+            observations.append((cycle_id, location_id, len(current), min(current.values(), default=None)))
+            previous = live.get(location_id)
+            live[location_id] = current
+            if previous is None:  # Baseline
+                appeared.extend((location_id, slot_id, start, ts) for slot_id, start in current.items())
+                continue
+            for slot_id, start in current.items():
+                if slot_id not in previous:
+                    events.append((ts, location_id, slot_id, start, "appeared"))
+                    appeared.append((location_id, slot_id, start, ts))
+            for slot_id, start in previous.items():
+                if slot_id not in current:
+                    events.append((ts, location_id, slot_id, start, "vanished"))
+                    vanished.append((location_id, slot_id))
+        db.executemany("INSERT INTO observations VALUES (?, ?, ?, ?)", observations)
+        db.executemany(
+            "INSERT OR REPLACE INTO locations_seen VALUES (?, ?)", [(location_id, ts) for location_id in snapshot]
+        )
+        db.executemany("INSERT INTO slot_events VALUES (?, ?, ?, ?, ?)", events)
+        db.executemany("INSERT OR REPLACE INTO live_slots VALUES (?, ?, ?, ?)", appeared)
+        db.executemany("DELETE FROM live_slots WHERE location_id = ? AND slot_id = ?", vanished)
+        db.executemany("DELETE FROM live_slots WHERE location_id = ?", unobserved)
+        db.executemany("DELETE FROM locations_seen WHERE location_id = ?", unobserved)
+
+
+def print_histogram(title, rows, labels):
+    counts = dict(rows)
+    peak = max(counts.values(), default=0) or 1
+    print(title)
+    for key, label in labels:
+        count = counts.get(key, 0)
+        print(f"  {label:>5} {count:>6}  {'#' * round(40 * count / peak)}")
+
+
+def patterns(path, days=None, location_id=None):
+    """Print when new slots get released, by local hour of day and day of week."""
+    if not os.path.exists(path):
+        print(f"{path} not found. Set `history_file` in the config and let the monitor run for a while.")
+        return
+    db = sqlite3.connect(path)
+    since = time.time() - days * 86400 if days else 0
+    where, params = "event = 'appeared' AND ts >= ?", [since]
+    if location_id is not None:
+        where += " AND location_id = ?"
+        params.append(location_id)
+
+    cycles, first, last = db.execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM cycles WHERE ts >= ?", (since,)).fetchone()
+    total, releases = db.execute(
+        f"SELECT COUNT(*), COUNT(DISTINCT CAST(ts AS INTEGER) || ':' || location_id) FROM slot_events WHERE {where}",
+        params,
+    ).fetchone()
+    if not cycles:
+        print(f"No cycles recorded in {path} yet.")
+        return
+    span = (last - first) / 3600
+    print(f"{cycles} cycles over {span:.1f} hours; {total} slots appeared in {releases} releases")
+    print("(a release is one office's new slots seen in one cycle)\n")
+
+    def by(fmt):
+        return db.execute(
+            f"SELECT CAST(strftime('{fmt}', ts, 'unixepoch', 'localtime') AS INTEGER), "
+            f"COUNT(DISTINCT CAST(ts AS INTEGER) || ':' || location_id) FROM slot_events WHERE {where} GROUP BY 1",
+            params,
+        ).fetchall()
+
+    print_histogram("Releases by hour of day (local time):", by("%H"), [(h, f"{h:02d}:00") for h in range(24)])
+    print()
+    weekdays = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+    print_histogram("Releases by day of week:", by("%w"), list(enumerate(weekdays)))
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show when new appointment slots get released.")
+    parser.add_argument("--file", default="availability_history.db", help="History database (`history_file`)")
+    parser.add_argument("--days", type=float, help="Only look at the last N days")
+    parser.add_argument("--location", type=int, help="Only look at one office Id")
+    args = parser.parse_args()
+    patterns(args.file, args.days, args.location)
+
+
+if __name__ == "__main__":
+    main()
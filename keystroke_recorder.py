@@ -1,26 +1,19 @@
 import argparse
-import json
 import os
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
-from pynput import keyboard
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from seleniumwire import webdriver
 
-DEFAULT_URL = "https://public.txdpsscheduler.com"
-
-
-def build_driver():
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(options=options)
-    return driver
+from browser import LOGIN_URL as DEFAULT_URL
+from browser import BrowserSession, EligibilityWatcher
+from recording import load_recording, save_recording
 
 
 def key_to_string(k) -> str:
+    from pynput import keyboard  # Imported lazily: only recording needs pynput (and a display)
+
     try:
         if isinstance(k, keyboard.KeyCode) and k.char is not None:
             return k.char
@@ -32,6 +25,8 @@ def key_to_string(k) -> str:
 
 
 def record_keystrokes_until(stop_condition_fn) -> List[Dict[str, Any]]:
+    from pynput import keyboard
+
     events: List[Dict[str, Any]] = []
     start_time = time.time()
     last_time = start_time
@@ -79,7 +74,7 @@ def string_to_selenium_keys(s: str):
     return s
 
 
-def replay_keystrokes(driver, events: List[Dict[str, Any]]):
+def replay_keystrokes(driver, events: Iterable[Dict[str, Any]]):
     try:
         body = driver.find_element(By.TAG_NAME, "body")
         body.click()
@@ -102,24 +97,18 @@ def replay_keystrokes(driver, events: List[Dict[str, Any]]):
                 pass
 
 
-def wait_for_eligibility_like(driver, manual: bool = True) -> Optional[Any]:
-    # Mirror logic from fingerprints.py: poll selenium-wire requests list
-    loops = 30 if manual else 5
-    for _ in range(loops):
-        time.sleep(2 if manual else 5)
-        try:
-            eligibility_request = [
-                req for req in driver.requests if req.url == "https://apptapi.txdpsscheduler.com/api/Eligibility"
-            ][0]
-            return eligibility_request
-        except Exception:
-            continue
-    return None
+def wait_for_eligibility_like(
+    driver, manual: bool = True, watcher: Optional[EligibilityWatcher] = None
+) -> Optional[Any]:
+    # Same wait as fingerprints.py: returns the Eligibility request as soon as it is sent, or None on timeout
+    watcher = watcher or EligibilityWatcher(driver)
+    return watcher.wait(60 if manual else 25)
 
 
 def record_cli(file_path: str):
-    driver = build_driver()
-    try:
+    with BrowserSession() as session:
+        driver = session.driver
+        watcher = EligibilityWatcher(driver)
         driver.get(DEFAULT_URL)
         try:
             body = driver.find_element(By.TAG_NAME, "body")
@@ -130,41 +119,36 @@ def record_cli(file_path: str):
         print("Will stop automatically when the Eligibility API request is detected.")
 
         def stop_when_login(_listener):
-            req = wait_for_eligibility_like(driver, manual=True)
+            req = wait_for_eligibility_like(driver, manual=True, watcher=watcher)
             if req is not None:
                 print("Detected Eligibility API request. Stopping recording...")
             else:
                 print("Timeout waiting for Eligibility request. Stopping recording anyway...")
 
         events = record_keystrokes_until(stop_when_login)
-        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
-        with open(file_path, "w") as f:
-            json.dump({"events": events}, f, indent=2)
+        save_recording(file_path, events)
         print(f"Saved {len(events)} key events to {file_path}")
         time.sleep(0.5)
-    finally:
-        driver.quit()
 
 
 def replay_cli(file_path: str):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Recording file not found: {file_path}")
-    with open(file_path, "r") as f:
-        data = json.load(f)
-    events: List[Dict[str, Any]] = data.get("events", [])
-    driver = build_driver()
-    try:
-        driver.get(DEFAULT_URL)
-        replay_keystrokes(driver, events)
+    events = load_recording(file_path)
+    with BrowserSession() as session:
+        session.driver.get(DEFAULT_URL)
+        replay_keystrokes(session.driver, events)
         time.sleep(1)
-    finally:
-        driver.quit()
 
 
 def main():
     parser = argparse.ArgumentParser(description="Record or replay keystrokes with original timing.")
     parser.add_argument("--mode", choices=["record", "replay"], required=True, help="Operation mode")
-    parser.add_argument("--save-file", required=True, help="Path to save to (record) or load from (replay)")
+    parser.add_argument(
+        "--save-file",
+        required=True,
+        help="Path to save to (record) or load from (replay). Recordings are binary unless the path ends in .json",
+    )
     args = parser.parse_args()
 
     if args.mode == "record":
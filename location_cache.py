@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import List, Optional
+
+from dps_client import Location
+from fileutil import atomic_write_json
+
+
+class LocationCache:
+    """On-disk TTL cache of the locations within `miles_within`, keyed by (zip_code, type_id, miles_within)."""
+
+    def __init__(self, path="location_cache.json", ttl=3600):
+        self.path = path
+        self.ttl = ttl  # Seconds; 0 disables the cache
+
+    @staticmethod
+    def _key(zip_code, type_id, miles_within):
+        return f"{zip_code}:{type_id}:{miles_within}"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except ValueError:
+            return {}
+
+    def get(self, zip_code, type_id, miles_within) -> Optional[List[Location]]:
+        if self.ttl <= 0:
+            return None
+        entry = self._load().get(self._key(zip_code, type_id, miles_within))
+        if entry is None or time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return [Location(**loc) for loc in entry["locations"]]
+
+    def put(self, zip_code, type_id, miles_within, locations: List[Location]):
+        if self.ttl <= 0:
+            return
+        data = self._load()
+        data[self._key(zip_code, type_id, miles_within)] = {
+            "fetched_at": time.time(),
+            "locations": [asdict(loc) for loc in locations],
+        }
+        atomic_write_json(self.path, data)
+
+    def invalidate(self, zip_code=None, type_id=None, miles_within=None):
+        """Drop one entry, or the whole cache if no key is given."""
+        if zip_code is None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        data = self._load()
+        if data.pop(self._key(zip_code, type_id, miles_within), None) is not None:
+            atomic_write_json(self.path, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the cached list of nearby DPS locations.")
+    parser.add_argument("--file", default="location_cache.json", help="Cache file")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached locations")
+    args = parser.parse_args()
+
+    cache = LocationCache(args.file)
+    if args.clear:
+        cache.invalidate()
+        print(f"Cleared {args.file}")
+        return
+    for key, entry in cache._load().items():
+        age = (time.time() - entry["fetched_at"]) / 60
+        print(f"{key} (fetched {age:.0f} min ago)")
+        for loc in entry["locations"]:
+            print(f"  {loc['id']:>6}  {loc['distance']:6.1f} mi  {loc['name']}")
+
+
+if __name__ == "__main__":
+    main()
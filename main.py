@@ -1,205 +1,192 @@
-from datetime import datetime, time
-
-import requests
-import urllib3
-import yaml
-
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config import ConfigError, load_config
+from dps_client import API_URL, AvailabilityDate, DpsApiError, DpsClient, Location, Slot
 from fingerprints import Authenticate
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-
-def main():
-    yaml_data = yaml.safe_load(open("config.yaml"))
-
-    # Extract date range and time
-    start_date_str = yaml_data["date"]["start"]
-    end_date_str = yaml_data["date"]["end"]
-    start_time_str = yaml_data["time"]["start"]
-    end_time_str = yaml_data["time"]["end"]
-
-    # Parse dates and times separately
-    start_date = datetime.strptime(start_date_str, "%m/%d/%Y").date()
-    end_date = datetime.strptime(end_date_str, "%m/%d/%Y").date()
-    start_time = datetime.strptime(start_time_str, "%H:%M").time()
-    end_time = datetime.strptime(end_time_str, "%H:%M").time()
-
-    def is_within_date_time_range(slot_datetime):
-        """Check if a datetime falls within the specified date range and time range on any day."""
-        slot_date = slot_datetime.date()
-        slot_time = slot_datetime.time()
-
-        # Check if date is within range
-        if not (start_date <= slot_date <= end_date):
-            return False
-
-        # Check if time is within range on that day
-        return start_time <= slot_time <= end_time
-
-    json_data = {
-        "TypeId": yaml_data["type_id"],
-        "ZipCode": yaml_data["zip_code"],
-        "CityName": "",
-        "PreferredDay": 0,
-    }
-
-    auth = Authenticate(
-        first_name=yaml_data["first_name"],
-        last_name=yaml_data["last_name"],
-        dob=yaml_data["dob"],
-        last_4_ssn=yaml_data["last_4_ssn"],
-        auth_mode=yaml_data.get("auth_mode", "manual"),
-        keystroke_file=yaml_data.get("keystroke_file", "login_recording.json"),
-    )
+from history import HistoryStore
+from location_cache import LocationCache
+from metrics import tracer
+from runlock import BUSY_EXIT_CODE, FileLock
+from scheduler import REQUEST_COUNT_ENV
+
+# Cycle outcomes
+WITHIN_RANGE = "within_range"
+NO_SLOTS = "no_slots"
+FOUND = "found"  # Dry run only: a slot was found but not held or booked
+BOOKED = "booked"
+BUSY = "busy"  # Another process was running a cycle, so this one did nothing
+
+
+@dataclass
+class CycleResult:
+    """Outcome of a single check-and-book cycle."""
+
+    status: str  # WITHIN_RANGE, NO_SLOTS, FOUND, BOOKED or BUSY
+    message: str
+    slot: Optional[Slot] = None
+    location: Optional[Location] = None
+    dates_requested: int = 0  # AvailableLocationDates requests sent
+    dates_skipped: int = 0  # Locations skipped because their next available date was outside the range
+    # Every AvailableLocationDates response of the cycle by location Id, for the availability history; None for
+    # listed offices that were not queried (pruned, after the search was done, or after a failure)
+    availability: Dict[int, Optional[List[AvailabilityDate]]] = field(default_factory=dict)
+
+
+def build_client(config):
+    # `api_url` can point the client at mock_server.py instead of the live API
+    return DpsClient(Authenticate.from_config(config), base_url=config.api_url or API_URL)
+
+
+def build_history(config):
+    return HistoryStore(config.history_file) if config.history_file else None
+
+
+def run_cycle(config, client, dry_run=False, history=None):
+    """Check the current booking and available slots once, booking a slot if one is found.
+
+    `client` is reused as-is so that long-running callers keep the token and the HTTP
+    connections between cycles. With `dry_run`, a found slot is reported but not held or booked.
+    The slots seen are handed to `history`, if given, which writes them in the background; that
+    includes the offices queried before a cycle failed.
+
+    Only one process runs a cycle at a time, so two can never hold or book the same slot; while another
+    one is running, this returns BUSY straight away.
+    """
+    cycle_lock = FileLock(config.cycle_lock_file)
+    if not cycle_lock.acquire(blocking=False):
+        return CycleResult(BUSY, f"Skipped: another cycle is running (pid {cycle_lock.holder()})")
+    availability = {}
+    try:
+        tracer.new_cycle()
+        with tracer.span("cycle") as span:
+            result = check_and_book(config, client, config.matcher, dry_run, availability)
+            span.update(
+                result=result.status, dates_requested=result.dates_requested, dates_skipped=result.dates_skipped
+            )
+    finally:
+        cycle_lock.release()
+        if history is not None and availability:
+            history.record(availability)
+    return result
+
+
+def check_and_book(config, client, matcher, dry_run=False, availability=None):
+    """One cycle's checks and booking. `availability`, if given, is filled in as offices are queried, so the
+    caller keeps what was seen even if the cycle raises; it ends up as the result's `availability`."""
+    first_name = config.first_name
+    last_name = config.last_name
+    dob = config.dob
+    last_4_ssn = config.last_4_ssn
 
     # Get current appointment info
-    payload = {
-        "FirstName": yaml_data["first_name"],
-        "LastName": yaml_data["last_name"],
-        "DateOfBirth": yaml_data["dob"],
-        "LastFourDigitsSsn": yaml_data["last_4_ssn"],
-    }
-    current_booking = requests.post(
-        "https://apptapi.txdpsscheduler.com/api/Booking",
-        headers=auth.get_headers(),
-        json=payload,
-        verify=False,
-    )
-    # Re-authenticate if the token is invalid
-    if current_booking.status_code != 200:
-        current_booking = requests.post(
-            "https://apptapi.txdpsscheduler.com/api/Booking",
-            headers=auth.get_headers(reauth=True),
-            json=payload,
-            verify=False,
-        )
-    assert current_booking.status_code == 200, "Authentication failure"
-    current_booking = current_booking.json()
+    current_booking = client.bookings(first_name, last_name, dob, last_4_ssn)
     if len(current_booking) > 0:  # There is a current appointment
-        current_booking = current_booking[0]["BookingDateTime"]  # 2024-10-21T15:20:00
-        current_booking = datetime.strptime(current_booking, "%Y-%m-%dT%H:%M:%S")  # 2024-10-21 15:20:00
+        current_booking = current_booking[0].booking_datetime  # 2024-10-21T15:20:00
         # Check if the current appointment already satisfies the required date/time range
-        if is_within_date_time_range(current_booking):
-            print("Current appointment is within the specified date and time range")
-            return
-
-    # Get list of available locations
-    response = requests.post(
-        "https://apptapi.txdpsscheduler.com/api/AvailableLocation",
-        headers=auth.get_headers(),
-        json=json_data,
-        verify=False,
-    )
-    if response.status_code != 200:  # TODO: Move checking into class itself!
-        response = requests.post(
-            "https://apptapi.txdpsscheduler.com/api/AvailableLocation",
-            headers=auth.get_headers(reauth=True),
-            json=json_data,
-            verify=False,
-        )
-
-    assert response.status_code == 200, "Authentication failure"
-    response = response.json()
-
-    # Check all locations for available timeslots within the needed date and time range
-    slot = None
-    slot_id = None
-    for location in response:
-        if location["Distance"] > yaml_data["miles_within"]:
+        if matcher.matches(current_booking):
+            return CycleResult(WITHIN_RANGE, "Current appointment is within the specified date and time range")
+
+    # Get list of locations within range. Pruning needs this cycle's next-available dates, since a cancellation
+    # can move them earlier at any time; one fresh AvailableLocation request can save a date request per office,
+    # so the cache is neither read nor written when pruning is on.
+    prune = config.prune_by_next_available
+    cache_key = (config.zip_code, config.type_id, config.miles_within)
+    location_cache = None if prune else LocationCache(config.location_cache_file, config.location_cache_ttl * 60)
+    locations = location_cache.get(*cache_key) if location_cache is not None else None
+    from_cache = locations is not None
+    if not from_cache:
+        locations = client.available_locations(config.type_id, config.zip_code)
+        locations = [location for location in locations if location.distance <= config.miles_within]
+        if location_cache is not None:
+            location_cache.put(*cache_key, locations)
+
+    # Check all locations for available timeslots within the needed date and time range, keeping the best one
+    search = matcher.search()
+    dates_requested = dates_skipped = 0
+    availability = {} if availability is None else availability
+    availability.update((location.id, None) for location in locations)  # Until queried
+    for location in matcher.order(locations):
+        if prune and search.can_skip(location):
+            dates_skipped += 1
             continue
-
         # Get timeslots for each location
-        payload = {
-            "LocationId": location["Id"],
-            "TypeId": yaml_data["type_id"],
-            "SameDay": False,
-            "StartDate": None,
-            "PreferredDay": 0,
-        }
-        timeslots = requests.post(
-            "https://apptapi.txdpsscheduler.com/api/AvailableLocationDates",
-            headers=auth.get_headers(),
-            json=payload,
-            verify=False,
-        ).json()
-
-        for date_info in timeslots["LocationAvailabilityDates"]:
-            for available_slot in date_info["AvailableTimeSlots"]:
-                slot_start_dt = datetime.strptime(available_slot["StartDateTime"], "%Y-%m-%dT%H:%M:%S")
-                # Check if slot falls within the date range and time range (same time window every day)
-                if is_within_date_time_range(slot_start_dt):
-                    slot = available_slot
-                    slot_id = slot["SlotId"]
-                    print(f"Found a slot: {slot['StartDateTime']} at {location['Name']}")
-                    break
-            if slot:
-                break
-        if slot:
+        try:
+            available_dates = client.available_dates(location.id, config.type_id)
+        except DpsApiError:
+            if from_cache:  # The cached office list may be outdated; fetch it again next cycle
+                location_cache.invalidate(*cache_key)
+            raise
+        dates_requested += 1
+        availability[location.id] = available_dates
+        search.consider(location, available_dates)
+        if search.done():
             break
 
-    if not slot:
-        print("No available slots within the specified date and time range")
-        return
+    if search.best is None:
+        return CycleResult(
+            NO_SLOTS,
+            "No available slots within the specified date and time range",
+            dates_requested=dates_requested,
+            dates_skipped=dates_skipped,
+            availability=availability,
+        )
+
+    slot, location = search.best.slot, search.best.location
+    found_message = f"Found a slot: {slot.start_datetime} at {location.name}"
+    if dry_run:
+        return CycleResult(FOUND, found_message, slot, location, dates_requested, dates_skipped, availability)
 
     # Hold the timeslot
-    payload = {
-        "SlotId": slot_id,
-        "FirstName": yaml_data["first_name"],
-        "LastName": yaml_data["last_name"],
-        "DateOfBirth": yaml_data["dob"],
-        "Last4Ssn": yaml_data["last_4_ssn"],
-    }
-    slot_held = requests.post(
-        "https://apptapi.txdpsscheduler.com/api/HoldSlot",
-        headers=auth.get_headers(),
-        json=payload,
-        verify=False,
-    ).json()
-    assert slot_held["SlotHeldSuccessfully"], "Failed to hold slot"
+    slot_held = client.hold_slot(slot.slot_id, first_name, last_name, dob, last_4_ssn)
+    assert slot_held, f"{found_message}\nFailed to hold slot"
 
     # Get Response ID
-    payload = {
-        "FirstName": yaml_data["first_name"],
-        "LastName": yaml_data["last_name"],
-        "DateOfBirth": yaml_data["dob"],
-        "LastFourDigitsSsn": yaml_data["last_4_ssn"],
-        "CardNumber": "",
-    }
-    eligibility = requests.post(
-        "https://apptapi.txdpsscheduler.com/api/Eligibility",
-        headers=auth.get_headers(),
-        json=payload,
-        verify=False,
-    ).json()
-    response_id = eligibility[0]["ResponseId"]
+    response_id = client.eligibility(first_name, last_name, dob, last_4_ssn)
 
     # Book the slot
-    payload = {
-        "CardNumber": "",
-        "FirstName": yaml_data["first_name"],
-        "LastName": yaml_data["last_name"],
-        "DateOfBirth": yaml_data["dob"],
-        "Last4Ssn": yaml_data["last_4_ssn"],
-        "Email": yaml_data["email"],
-        "CellPhone": "",
-        "HomePhone": "",
-        "ServiceTypeId": yaml_data["type_id"],
-        "BookingDateTime": slot["StartDateTime"],
-        "BookingDuration": 20,
-        "SlotId": slot_id,
-        "SpanishLanguage": "N",
-        "SiteId": location["Id"],
-        "SendSms": False,
-        "AdaRequired": False,
-        "ResponseId": response_id,
-    }
-    booking = requests.post(
-        "https://apptapi.txdpsscheduler.com/api/NewBooking",
-        headers=auth.get_headers(),
-        json=payload,
-        verify=False,
-    ).json()
-    print("Booking successful!")
+    client.new_booking(
+        slot, location, response_id, first_name, last_name, dob, last_4_ssn, config.email, config.type_id
+    )
+    return CycleResult(
+        BOOKED, f"{found_message}\nBooking successful!", slot, location, dates_requested, dates_skipped, availability
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check for, hold and book a DPS appointment once.")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Look for a slot and report the requests made, without booking."
+    )
+    args = parser.parse_args()
+
+    try:
+        config = load_config()
+    except ConfigError as e:
+        sys.exit(str(e))
+    tracer.configure(config.metrics_file)
+    client = build_client(config)
+    history = build_history(config)
+    try:
+        result = run_cycle(config, client, dry_run=args.dry_run, history=history)
+    finally:
+        client.close()
+        if history is not None:
+            history.close()
+        if os.environ.get(REQUEST_COUNT_ENV):  # Running under monitor.py, which budgets requests per hour
+            with open(os.environ[REQUEST_COUNT_ENV], "w") as f:
+                f.write(str(client.request_count))
+    print(result.message)
+    if result.status == BUSY:
+        sys.exit(BUSY_EXIT_CODE)
+    if args.dry_run:
+        print(
+            f"Date requests: {result.dates_requested} sent, {result.dates_skipped} skipped by next available date "
+            f"({client.request_count} API requests in total)"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from config import RANKINGS
+from dps_client import AvailabilityDate, Location, Slot
+
+
+@dataclass
+class Candidate:
+    slot: Slot
+    location: Location
+
+
+class SlotMatcher:
+    """Date/time window compiled once from the config, used to pick the best slot across locations.
+
+    Slot times come from the API as ISO strings (2024-10-21T15:20:00), whose date and time parts
+    compare correctly as plain strings, so no slot is ever parsed into a datetime.
+    """
+
+    def __init__(self, start_date, end_date, start_time, end_time, ranking="closest", preferred_locations=()):
+        if ranking not in RANKINGS:
+            raise ValueError(f"ranking must be one of {', '.join(RANKINGS)}, not {ranking!r}")
+        self.date_lo = start_date.isoformat()
+        self.date_hi = end_date.isoformat()
+        self.time_lo = start_time.strftime("%H:%M:%S")
+        self.time_hi = end_time.strftime("%H:%M:%S")
+        self.ranking = ranking
+        # Preferred offices by Id or Name, most preferred first
+        self.preference = {}
+        for rank, location in enumerate(preferred_locations):
+            self.preference.setdefault(str(location), rank)
+        self.unpreferred_rank = len(preferred_locations)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.start_date,
+            config.end_date,
+            config.start_time,
+            config.end_time,
+            ranking=config.ranking,
+            preferred_locations=config.preferred_locations,
+        )
+
+    def matches(self, start_datetime) -> bool:
+        """Check if an ISO datetime string falls within the date range and the time range on that day."""
+        return (
+            self.date_lo <= start_datetime[:10] <= self.date_hi
+            and self.time_lo <= start_datetime[11:19] <= self.time_hi
+        )
+
+    def preference_rank(self, location) -> int:
+        rank = self.preference.get(str(location.id), self.preference.get(location.name))
+        return self.unpreferred_rank if rank is None else rank
+
+    def order(self, locations: Iterable[Location]) -> List[Location]:
+        """Order in which to query locations, so `SlotSearch.done` can stop early."""
+        if self.ranking == "preferred":
+            return sorted(locations, key=lambda location: (self.preference_rank(location), location.distance))
+        return sorted(locations, key=lambda location: location.distance)
+
+    def search(self) -> "SlotSearch":
+        return SlotSearch(self)
+
+
+class SlotSearch:
+    """Best candidate so far within one cycle; feed it each location's availability in `order`."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.best: Optional[Candidate] = None
+        self._best_key = None
+
+    def _key(self, candidate):
+        matcher = self.matcher
+        if matcher.ranking == "closest":
+            return (candidate.location.distance, candidate.slot.start_datetime)
+        if matcher.ranking == "preferred":
+            return (matcher.preference_rank(candidate.location), candidate.slot.start_datetime)
+        return (candidate.slot.start_datetime, candidate.location.distance)
+
+    def consider(self, location: Location, dates: List[AvailabilityDate]):
+        matcher = self.matcher
+        earliest = None
+        # Days after this cutoff can't improve on what has been found already
+        cutoff = self.best.slot.start_datetime[:10] if self.best is not None and matcher.ranking == "earliest" else None
+        for date_info in dates:
+            # Skip whole days outside the date range before looking at their slots
+            if date_info.date is not None:
+                day = date_info.date[:10]
+                if not matcher.date_lo <= day <= matcher.date_hi or (cutoff is not None and day > cutoff):
+                    continue
+            for slot in date_info.slots:
+                start = slot.start_datetime
+                if matcher.matches(start) and (earliest is None or start < earliest.start_datetime):
+                    earliest = slot
+                    cutoff = start[:10]
+        if earliest is None:
+            return
+        candidate = Candidate(earliest, location)
+        key = self._key(candidate)
+        if self._best_key is None or key < self._best_key:
+            self.best, self._best_key = candidate, key
+
+    def can_skip(self, location: Location) -> bool:
+        """True if the location's next available date shows it can't have a slot that would be chosen."""
+        next_available = location.next_available
+        if next_available is None:
+            return False
+        if next_available > self.matcher.date_hi:
+            return True
+        # Under "earliest", an office whose first opening is after the best slot found can't beat it
+        return (
+            self.best is not None
+            and self.matcher.ranking == "earliest"
+            and next_available > self.best.slot.start_datetime[:10]
+        )
+
+    def done(self) -> bool:
+        """True once no location later in `order` can beat the best candidate."""
+        if self.best is None:
+            return False
+        if self.matcher.ranking == "closest":
+            return True
+        if self.matcher.ranking == "preferred":
+            return self.matcher.preference_rank(self.best.location) < self.matcher.unpreferred_rank
+        return False
@@ -0,0 +1,87 @@
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class Tracer:
+    """Writes one JSON line per timed phase (token load, browser login, each API call, whole cycle).
+
+    Disabled until `configure` is given a file, so spans cost next to nothing by default.
+    """
+
+    def __init__(self):
+        self.cycle = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def configure(self, path):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, "a", buffering=1) if path else None
+
+    def new_cycle(self):
+        self.cycle += 1
+        return self.cycle
+
+    @contextmanager
+    def span(self, phase, **attrs):
+        """Time a phase. The yielded dict can be updated with attributes such as `status` and `bytes`;
+        a span fails if it raises, sets `ok` to False, or records a non-200 `status`."""
+        record = dict(attrs)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            if self._file is not None:
+                record.setdefault("ok", record.get("status", 200) == 200)
+                record.update(phase=phase, cycle=self.cycle, ts=time.time(), ms=(time.perf_counter() - start) * 1000)
+                line = json.dumps(record)
+                with self._lock:
+                    self._file.write(line + "\n")
+
+
+tracer = Tracer()
+
+
+def report(path):
+    """Print p50/p95/p99 latency and failure counts per phase from a spans file."""
+    phases = {}
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                phases.setdefault(span["phase"], []).append(span)
+
+    print(f"{'phase':<36}{'count':>7}{'failed':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'avg KiB':>9}")
+    for phase, spans in sorted(phases.items()):
+        durations = [s["ms"] for s in spans]
+        failed = sum(1 for s in spans if not s["ok"])
+        sizes = [s["bytes"] for s in spans if "bytes" in s]
+        avg_kib = f"{sum(sizes) / len(sizes) / 1024:.1f}" if sizes else "-"
+        print(
+            f"{phase:<36}{len(spans):>7}{failed:>8}"
+            + "".join(f"{percentile(durations, q):>10.1f}" for q in (50, 95, 99))
+            + f"{avg_kib:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-phase timing spans written by main.py/monitor.py.")
+    parser.add_argument("file", help="Spans file (the `metrics_file` from config.yaml)")
+    args = parser.parse_args()
+    report(args.file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fingerprints import Authenticate
+from runlock import FileLock
+
+
+def synthetic_fixtures(locations=20, days=60, slots_per_day=16, start=None, seed=0):
+    """Build AvailableLocation/AvailableLocationDates payloads for `locations` offices with `days` days of slots."""
+    rng = random.Random(seed)
+    start = start or date.today() + timedelta(days=1)
+    fixtures = {"locations": [], "dates": {}, "bookings": []}
+    slot_id = 1000
+    for i in range(locations):
+        location_id = 100 + i
+        availability = []
+        for d in range(days):
+            day = start + timedelta(days=d)
+            if day.weekday() >= 5 or rng.random() < 0.2:  # Closed on weekends, some days fully booked
+                continue
+            slots = []
+            for minute in sorted(rng.sample(range(8 * 60, 17 * 60, 20), min(slots_per_day, 27))):
+                slot_start = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+                slots.append(
+                    {
+                        "SlotId": slot_id,
+                        "Duration": 20,
+                        "StartDateTime": slot_start.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "FormattedStartDateTime": slot_start.strftime("%B %d, %Y %I:%M %p"),
+                        "FormattedTime": slot_start.strftime("%I:%M %p"),
+                    }
+                )
+                slot_id += 1
+            availability.append(
+                {
+                    "LocationId": location_id,
+                    "AvailabilityDate": day.strftime("%Y-%m-%dT00:00:00"),
+                    "DayOfWeek": day.isoweekday() % 7,
+                    "FormattedAvailabilityDate": day.strftime("%m/%d/%Y"),
+                    "AvailableTimeSlots": slots,
+                }
+            )
+        fixtures["locations"].append(
+            {
+                "Id": location_id,
+                "Name": f"Mock Office {location_id}",
+                "Address": f"{location_id} Main St",
+                "Distance": round(rng.uniform(0.5, 40), 1),
+                "NextAvailableDate": (
+                    datetime.strptime(availability[0]["AvailabilityDate"], "%Y-%m-%dT%H:%M:%S").strftime("%m/%d/%Y")
+                    if availability
+                    else None
+                ),
+            }
+        )
+        fixtures["dates"][str(location_id)] = {"LocationAvailabilityDates": availability}
+    return fixtures
+
+
+class MockDpsState:
+    """Fixtures plus scenario knobs (token expiry, hold failures) and per-endpoint request counters."""
+
+    def __init__(self, fixtures, token_requests=None, token_ttl=None, hold_failures=0, latency=0.0):
+        self.fixtures = fixtures
+        self.token_requests = token_requests  # Requests a token may make before it is rejected
+        self.token_ttl = token_ttl  # Seconds a token is valid for after first use
+        self.hold_failures = hold_failures  # Number of HoldSlot calls that fail before one succeeds
+        self.latency = latency  # Seconds added to every response
+        self.counts = {}
+        self.tokens = {}  # token -> [first seen, requests made]
+        self.lock = threading.Lock()
+        self._dates = {
+            location_id: json.dumps(payload).encode() for location_id, payload in fixtures["dates"].items()
+        }
+        self._slots = {
+            slot["SlotId"]: slot
+            for payload in fixtures["dates"].values()
+            for day in payload["LocationAvailabilityDates"]
+            for slot in day["AvailableTimeSlots"]
+        }
+
+    def issue_token(self):
+        token = f"Bearer mock-{secrets.token_hex(8)}"
+        with self.lock:
+            self.tokens[token] = [time.time(), 0]
+            self.counts["token"] = self.counts.get("token", 0) + 1
+        return token
+
+    def check_token(self, token):
+        with self.lock:
+            seen = self.tokens.setdefault(token, [time.time(), 0])  # Accept tokens issued elsewhere
+            seen[1] += 1
+            if self.token_requests is not None and seen[1] > self.token_requests:
+                return False
+            if self.token_ttl is not None and time.time() - seen[0] > self.token_ttl:
+                return False
+            return True
+
+    def handle(self, endpoint, payload):
+        """Return (status, body bytes) for an API call."""
+        if endpoint == "Booking":
+            return 200, json.dumps(self.fixtures["bookings"]).encode()
+        if endpoint == "AvailableLocation":
+            return 200, json.dumps(self.fixtures["locations"]).encode()
+        if endpoint == "AvailableLocationDates":
+            body = self._dates.get(str(payload.get("LocationId")))
+            return (200, body) if body is not None else (400, b'{"Message": "Unknown location"}')
+        if endpoint == "HoldSlot":
+            with self.lock:
+                held = self.hold_failures <= 0 and payload.get("SlotId") in self._slots
+                self.hold_failures -= 1
+            return 200, json.dumps({"SlotHeldSuccessfully": held}).encode()
+        if endpoint == "Eligibility":
+            return 200, json.dumps([{"ResponseId": 123456}]).encode()
+        if endpoint == "NewBooking":
+            slot = self._slots.get(payload.get("SlotId"))
+            if slot is None:
+                return 400, b'{"Message": "Unknown slot"}'
+            with self.lock:
+                self.fixtures["bookings"] = [{"BookingDateTime": slot["StartDateTime"]}]
+            return 200, json.dumps({"Booking": {"ConfirmationNumber": "MOCK0001"}}).encode()
+        return 404, b'{"Message": "Not found"}'
+
+
+class MockDpsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path == "/mock/stats":
+            with state.lock:
+                return self._send(200, json.dumps(state.counts).encode())
+        self._send(404, b'{"Message": "Not found"}')
+
+    def do_POST(self):
+        state = self.server.state
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/mock/token":
+            return self._send(200, json.dumps({"auth_token": state.issue_token()}).encode())
+        if self.path == "/mock/stats/reset":
+            with state.lock:
+                state.counts.clear()
+            return self._send(200, b"{}")
+        if not self.path.startswith("/api/"):
+            return self._send(404, b'{"Message": "Not found"}')
+
+        endpoint = self.path[len("/api/") :]
+        with state.lock:
+            state.counts[endpoint] = state.counts.get(endpoint, 0) + 1
+        if state.latency:
+            time.sleep(state.latency)
+        if not state.check_token(self.headers.get("Authorization")):
+            return self._send(401, b'{"Message": "Authorization has been denied for this request."}')
+        self._send(*state.handle(endpoint, payload))
+
+
+class MockDpsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockDpsHandler)
+        self.state = state
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/api"
+
+
+class MockAuthenticate(Authenticate):
+    """fingerprints.Authenticate that gets tokens from a mock server instead of a browser login.
+
+    Token storage and the cross-process login lock are the real ones, kept in `token_file`.
+    """
+
+    def __init__(self, base_url, token_file="auth_token.json"):
+        self.base_url = base_url
+        self.auth_token = None
+        self.token_file = token_file
+        self.auth_lock = FileLock(token_file + ".lock")
+        self.logins = 0
+        self._load_token()
+
+    def _log_in(self):
+        request = urllib.request.Request(f"{self.base_url}/mock/token", data=b"{}", method="POST")
+        with urllib.request.urlopen(request) as response:
+            self.auth_token = json.load(response)["auth_token"]
+        self.logins += 1
+        self._save_token()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the DPS scheduler API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (0 picks a free one)")
+    parser.add_argument("--fixtures", help="JSON fixture file (recorded or from --save-fixtures)")
+    parser.add_argument("--save-fixtures", help="Write the synthetic fixtures to this file and exit")
+    parser.add_argument("--locations", type=int, default=20, help="Synthetic offices")
+    parser.add_argument("--days", type=int, default=60, help="Synthetic days of availability per office")
+    parser.add_argument("--slots-per-day", type=int, default=16)
+    parser.add_argument("--token-requests", type=int, help="Reject a token after this many requests")
+    parser.add_argument("--token-ttl", type=float, help="Reject a token this many seconds after its first use")
+    parser.add_argument("--hold-failures", type=int, default=0, help="Fail this many HoldSlot calls first")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to every response")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures, "r") as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = synthetic_fixtures(args.locations, args.days, args.slots_per_day)
+    if args.save_fixtures:
+        with open(args.save_fixtures, "w") as f:
+            json.dump(fixtures, f)
+        print(f"Saved fixtures for {len(fixtures['locations'])} locations to {args.save_fixtures}")
+        return
+
+    state = MockDpsState(fixtures, args.token_requests, args.token_ttl, args.hold_failures, args.latency)
+    server = MockDpsServer(state, args.host, args.port)
+    print(server.api_url, flush=True)  # Set `api_url` in config.yaml to this to point main.py at the mock
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
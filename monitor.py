@@ -1,69 +1,239 @@
 import argparse
+import cProfile
 import logging
+import os
 import subprocess
+import sys
+import tempfile
 import time
 
-import apprise
-import yaml
+from browser import reap_orphans
+from config import ConfigError, ConfigWatcher
+from notifier import NotificationDispatcher
+from runlock import BUSY_EXIT_CODE
+from scheduler import REQUEST_COUNT_ENV, PollScheduler, parse_retry_after
 
+# Settings that the API client and its Authenticate are built from; changing any of them needs a new client
+CLIENT_SETTINGS = (
+    "first_name",
+    "last_name",
+    "dob",
+    "last_4_ssn",
+    "auth_mode",
+    "keystroke_file",
+    "browser_max_memory",
+    "browser_max_minutes",
+    "api_url",
+)
+
+
+def build_notifier(config):
+    return NotificationDispatcher(
+        config.notification_urls, timeout=config.notification_timeout, retries=config.notification_retries
+    )
+
+
+def build_scheduler(interval, config):
+    scheduler = PollScheduler(interval * 60)
+    scheduler.set_limits(config.max_requests_per_hour, config.max_backoff * 60)
+    return scheduler
 
-def load_apprise_config():
-    """Load Apprise configuration from config.yaml"""
-    try:
-        with open("config.yaml", "r") as file:
-            config = yaml.safe_load(file)
 
-        apobj = apprise.Apprise()
+def notifier_changed(old, new):
+    return (old.notification_urls, old.notification_timeout, old.notification_retries) != (
+        new.notification_urls, new.notification_timeout, new.notification_retries
+    )
 
-        # Load notification URLs from config
-        notification_urls = config.get("notifications", {}).get("urls", [])
-        for url in notification_urls:
-            if url:  # Skip empty/None URLs
-                apobj.add(url)
 
-        return apobj
-    except FileNotFoundError:
-        logging.warning("config.yaml not found. Using default Apprise configuration.")
-        return apprise.Apprise()
-    except Exception as e:
-        logging.error(f"Error loading Apprise configuration: {e}")
-        return apprise.Apprise()
+def wait_for_next_cycle(scheduler, interval):
+    delay = scheduler.next_delay()
+    if delay > interval * 60:
+        logging.info(f"Backing off: next cycle in {delay / 60:.1f} minutes.")
+    time.sleep(delay)
 
 
-# Initialize Apprise with configuration from YAML
-apobj = load_apprise_config()
+def run_command(command, env=None):
+    result = subprocess.run(command, shell=True, capture_output=True, text=True, env=env)
+    return result.stdout + result.stderr, result.returncode
 
 
-def run_command(command):
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
-    return result.stdout + result.stderr
+def read_request_count(path):
+    """Requests the command reported through REQUEST_COUNT_ENV, or None if it didn't report any."""
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
 
 
-def monitor_command(command, interval):
+def monitor_command(command, interval, watcher):
+    config = watcher.config
+    scheduler = build_scheduler(interval, config)
+    notifier = build_notifier(config)
     last_output = None
+    fd, count_file = tempfile.mkstemp(prefix="dps-requests-")
+    os.close(fd)
+    env = dict(os.environ, **{REQUEST_COUNT_ENV: count_file})
+    warned_unbudgeted = False
     while True:
-        current_output = run_command(command)
+        if watcher.poll():  # The command re-reads config.yaml itself; only the monitor's own settings change here
+            scheduler.set_limits(watcher.config.max_requests_per_hour, watcher.config.max_backoff * 60)
+            if notifier_changed(config, watcher.config):
+                notifier = build_notifier(watcher.config)
+            config = watcher.config
+
+        os.truncate(count_file, 0)
+        current_output, returncode = run_command(command, env)
+        requests_sent = read_request_count(count_file)
+        if requests_sent is not None:
+            scheduler.record_requests(requests_sent)
+        elif config.max_requests_per_hour and not warned_unbudgeted:
+            logging.warning(
+                "The command did not report its request count (only main.py does), "
+                "so schedule.max_requests_per_hour is not applied."
+            )
+            warned_unbudgeted = True
+        if returncode == BUSY_EXIT_CODE:  # Another process is mid-cycle; try again next time
+            logging.info(current_output.strip())
+            wait_for_next_cycle(scheduler, interval)
+            continue
+        if returncode == 0:
+            scheduler.success()
+        else:
+            scheduler.failure()
         if current_output != last_output:
             logging.info(f"Output changed:\n\n{current_output}")
-            apobj_current_output = current_output.replace("\n", "\r\n ")
-            apobj_current_output = current_output.replace("<", "")
-            apobj.notify(body=f"Output changed:\r\n{apobj_current_output}")
+            notify_output = current_output.replace("\n", "\r\n ").replace("<", "")
+            notifier.notify(f"Output changed:\r\n{notify_output}")
             last_output = current_output
             if last_output.strip() == "Current appointment is within the specified date and time range":
-                apobj.notify(body="Stopping the monitor script")
+                notifier.notify("Stopping the monitor script")
+                notifier.flush()
+                os.remove(count_file)
                 return
         else:
             logging.info("Output unchanged.")
-        time.sleep(interval * 60)
+        wait_for_next_cycle(scheduler, interval)
+
+
+def monitor_daemon(interval, watcher, profile_dir=None):
+    """Run the check-and-book cycle in-process, keeping the config, auth and HTTP session between cycles.
+
+    Edits to config.yaml take effect at the start of the next cycle. With `profile_dir`, each cycle
+    runs under cProfile and its stats are saved as cycle-<n>.prof.
+    """
+    import main as dps
+    from dps_client import DpsApiError
+    from metrics import tracer
+
+    config = watcher.config
+    tracer.configure(config.metrics_file)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    scheduler = build_scheduler(interval, config)
+    notifier = build_notifier(config)
+    history = dps.build_history(config)
+    client = None
+    last_result = None
+    while True:
+        if watcher.poll():
+            new_config = watcher.config
+            scheduler.set_limits(new_config.max_requests_per_hour, new_config.max_backoff * 60)
+            if notifier_changed(config, new_config):
+                notifier = build_notifier(new_config)
+            if new_config.metrics_file != config.metrics_file:
+                tracer.configure(new_config.metrics_file)
+            if new_config.history_file != config.history_file:
+                if history is not None:
+                    history.close()
+                history = dps.build_history(new_config)
+            if client is not None and any(
+                getattr(new_config, name) != getattr(config, name) for name in CLIENT_SETTINGS
+            ):
+                client.close()
+                client = None
+            config = new_config
+
+        requests_before = client.request_count if client is not None else 0
+        try:
+            if client is None:  # Authentication may fail; retry on the next cycle like the subprocess mode does
+                client = dps.build_client(config)
+            if profile_dir:
+                profiler = cProfile.Profile()
+                try:
+                    result = profiler.runcall(dps.run_cycle, config, client, history=history)
+                finally:
+                    profiler.dump_stats(os.path.join(profile_dir, f"cycle-{tracer.cycle}.prof"))
+            else:
+                result = dps.run_cycle(config, client, history=history)
+            if result.status == dps.BUSY:  # Another process is mid-cycle; try again next time
+                logging.info(result.message)
+                wait_for_next_cycle(scheduler, interval)
+                continue
+            current_result = (result.status, result.message)
+            scheduler.success()
+            if result.status == dps.WITHIN_RANGE:
+                scheduler.pause()
+        except DpsApiError as e:  # Includes 429/5xx; honor the server's Retry-After
+            logging.exception("Cycle failed")
+            current_result = ("error", f"{type(e).__name__}: {e}")
+            scheduler.failure(parse_retry_after(e.headers.get("Retry-After")))
+        except Exception as e:
+            logging.exception("Cycle failed")
+            current_result = ("error", f"{type(e).__name__}: {e}")
+            scheduler.failure()
+        if client is not None:
+            scheduler.record_requests(client.request_count - requests_before)
+
+        if current_result != last_result:
+            logging.info(f"Result changed:\n\n{current_result[1]}")
+            notify_output = current_result[1].replace("\n", "\r\n ").replace("<", "")
+            notifier.notify(f"Result changed:\r\n{notify_output}")
+            last_result = current_result
+        else:
+            logging.info("Result unchanged.")
+        if scheduler.paused:
+            notifier.notify("Stopping the monitor script")
+            client.close()
+            if history is not None:
+                history.close()
+            notifier.flush()
+            return
+
+        # Refresh a token that would expire before the next cycle now, rather than mid-cycle after a failed call
+        if client is not None:
+            try:
+                if client.auth.refresh_if_expiring((interval + config.token_refresh_margin) * 60):
+                    logging.info("Refreshed auth token ahead of expiry.")
+            except Exception:
+                logging.exception("Token refresh failed")
+        wait_for_next_cycle(scheduler, interval)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Monitor a command's output for changes.")
-    parser.add_argument("command", help="The command to run.")
+    parser.add_argument("command", nargs="?", help="The command to run (omit with --daemon).")
     parser.add_argument("interval", type=int, help="The interval (in minutes) to run the command.")
+    parser.add_argument(
+        "--daemon", action="store_true", help="Run main.py's cycle in this process instead of spawning a command."
+    )
+    parser.add_argument("--profile-dir", help="With --daemon, save a cProfile dump of each cycle to this directory.")
 
     args = parser.parse_args()
+    if not args.daemon and not args.command:
+        parser.error("command is required unless --daemon is given")
 
     logging.basicConfig(format="%(asctime)s [%(levelname)8s]: %(message)s", level=logging.INFO)
 
-    monitor_command(args.command, args.interval)
+    try:
+        watcher = ConfigWatcher("config.yaml")
+    except ConfigError as e:
+        # Also without --daemon: the notification and schedule settings come from the same validated file
+        sys.exit(f"{e}\nmonitor.py needs a config.yaml that main.py would accept, in both modes; fix it and restart.")
+
+    # Kill any Chrome a previous run leaked before it crashed or was killed
+    reap_orphans()
+    if args.daemon:
+        monitor_daemon(args.interval, watcher, args.profile_dir)
+    else:
+        monitor_command(args.command, args.interval, watcher)
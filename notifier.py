@@ -0,0 +1,87 @@
+import logging
+import queue
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import apprise
+
+
+def with_timeouts(url, timeout):
+    """`url` with Apprise's connect and read timeouts (cto/rto) set to `timeout`, unless it sets them itself."""
+    params = parse_qs(urlsplit(url).query)
+    added = "&".join(f"{name}={timeout:g}" for name in ("cto", "rto") if name not in params)
+    if not added:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}{added}"
+
+
+class NotificationTarget:
+    """One Apprise URL with its own queue and worker thread, so a slow target never holds up the others."""
+
+    def __init__(self, url, timeout, retries, retry_delay):
+        self.url = url
+        self.apobj = apprise.Apprise()
+        # The service's own socket timeouts bound each send, so notify() returns by itself
+        self.valid = self.apobj.add(with_timeouts(url, timeout))
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+        self.pending = []  # Bodies queued or being sent, for coalescing
+        self.lock = threading.Lock()
+        if self.valid:
+            threading.Thread(target=self._run, name="notify", daemon=True).start()
+
+    def submit(self, body):
+        with self.lock:
+            if body in self.pending:  # Identical message already on its way
+                return
+            self.pending.append(body)
+        self.queue.put(body)
+
+    def _run(self):
+        while True:
+            body = self.queue.get()
+            for attempt in range(self.retries + 1):
+                if self.apobj.notify(body=body):
+                    break
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * 2**attempt)
+            else:
+                scheme = self.url.split("://")[0]
+                logging.warning(f"Notification to {scheme}:// failed after {self.retries + 1} attempts")
+            with self.lock:
+                self.pending.remove(body)
+            self.queue.task_done()
+
+    def idle(self):
+        with self.lock:
+            return not self.pending
+
+
+class NotificationDispatcher:
+    """Sends notifications in the background with per-target timeouts and retries.
+
+    `notify` only enqueues, so the poll loop never waits on a notification backend.
+    """
+
+    def __init__(self, urls=(), timeout=10, retries=2, retry_delay=5):
+        self.targets = []
+        for url in urls:
+            if not url:  # Skip empty/None URLs
+                continue
+            target = NotificationTarget(url, timeout, retries, retry_delay)
+            if target.valid:
+                self.targets.append(target)
+            else:
+                logging.error(f"Invalid notification URL for {url.split('://')[0]}://")
+
+    def notify(self, body):
+        for target in self.targets:
+            target.submit(body)
+
+    def flush(self, timeout=30):
+        """Wait up to `timeout` seconds for queued notifications, e.g. before exiting."""
+        deadline = time.monotonic() + timeout
+        while not all(target.idle() for target in self.targets) and time.monotonic() < deadline:
+            time.sleep(0.1)
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+# Binary keystroke recordings (.krec):
+#   header: magic, format version, number of distinct keys, number of events
+#   key table: each key string as a length-prefixed UTF-8 string, in first-use order
+#   events: (index into the key table, seconds since the previous key) per key press
+# dt is kept as a float64 so replay timing is exactly what was recorded.
+MAGIC = b"KREC"
+VERSION = 1
+HEADER = struct.Struct("<4sBHI")
+KEY_LENGTH = struct.Struct("<H")
+EVENT = struct.Struct("<Hd")
+EVENTS_PER_READ = 4096
+
+
+class RecordingError(ValueError):
+    pass
+
+
+class BinaryRecording:
+    """A .krec file whose events are read lazily, a chunk at a time, each time it is iterated.
+
+    The header and key table are read and checked up front, so a bad file fails before a browser is started.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise RecordingError(f"{path}: truncated header")
+            magic, version, key_count, self.count = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise RecordingError(f"{path}: not a keystroke recording")
+            if version != VERSION:
+                raise RecordingError(f"{path}: unsupported recording version {version}")
+            self.keys = []
+            try:
+                for _ in range(key_count):
+                    (length,) = KEY_LENGTH.unpack(f.read(KEY_LENGTH.size))
+                    self.keys.append(f.read(length).decode("utf-8"))
+            except (struct.error, UnicodeDecodeError):
+                raise RecordingError(f"{path}: corrupt key table")
+            self._events_offset = f.tell()
+        expected = self._events_offset + self.count * EVENT.size
+        if os.path.getsize(path) != expected:
+            raise RecordingError(f"{path}: expected {expected} bytes for {self.count} events")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        keys = self.keys
+        with open(self.path, "rb") as f:
+            f.seek(self._events_offset)
+            while True:
+                chunk = f.read(EVENT.size * EVENTS_PER_READ)
+                if not chunk:
+                    return
+                for index, dt in EVENT.iter_unpack(chunk):
+                    if index >= len(keys):
+                        raise RecordingError(f"{self.path}: key index {index} out of range")
+                    yield {"k": keys[index], "dt": dt}
+
+
+def is_binary(path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_recording(path) -> Union[BinaryRecording, List[Dict[str, Any]]]:
+    """Events of a recording in either format, as {"k": key, "dt": seconds} dicts in order."""
+    if is_binary(path):
+        return BinaryRecording(path)
+    with open(path, "r") as f:
+        return json.load(f).get("events", [])
+
+
+def write_binary(path, events: Iterable[Dict[str, Any]]):
+    keys: Dict[str, int] = {}
+    records = []
+    for e in events:
+        key = e.get("k")
+        index = keys.setdefault(key, len(keys))
+        records.append(EVENT.pack(index, float(e.get("dt", 0))))
+    if len(keys) > 0xFFFF:
+        raise RecordingError(f"Too many distinct keys ({len(keys)}) for a recording")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), len(records)))
+        for key in keys:
+            encoded = key.encode("utf-8")
+            f.write(KEY_LENGTH.pack(len(encoded)) + encoded)
+        f.write(b"".join(records))
+
+
+def save_recording(path, events: List[Dict[str, Any]]):
+    """Save in the binary format, or as JSON like older versions if the path ends in .json."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump({"events": events}, f, indent=2)
+    else:
+        write_binary(path, events)
+
+
+def convert_cli(args):
+    destination = args.destination or os.path.splitext(args.source)[0] + ".krec"
+    events = list(load_recording(args.source))
+    write_binary(destination, events)
+    print(f"Wrote {len(events)} key events to {destination} ({os.path.getsize(destination)} bytes)")
+    return 0
+
+
+def info_cli(args):
+    """Check that each recording loads completely and summarize it."""
+    failed = False
+    for path in args.files:
+        try:
+            recording = load_recording(path)
+            count = duration = 0
+            keys = set()
+            for e in recording:
+                count += 1
+                duration += float(e.get("dt", 0))
+                keys.add(e.get("k"))
+        except (OSError, ValueError) as e:  # RecordingError and json.JSONDecodeError are ValueErrors
+            print(e if isinstance(e, RecordingError) else f"{path}: {e}")
+            failed = True
+            continue
+        kind = f"binary v{VERSION}" if isinstance(recording, BinaryRecording) else "json"
+        print(f"{path}: {kind}, {count} key events, {len(keys)} distinct keys, {duration:.1f} s")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and convert keystroke recordings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert a JSON recording to the binary format.")
+    convert.add_argument("source")
+    convert.add_argument("destination", nargs="?", help="Defaults to the source path with a .krec extension")
+    convert.set_defaults(func=convert_cli)
+
+    info = subparsers.add_parser("info", help="Validate recordings and show their size and duration.")
+    info.add_argument("files", nargs="+")
+    info.set_defaults(func=info_cli)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
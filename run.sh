@@ -1,3 +1,3 @@
 #!/bin/bash
 
-python monitor.py "python main.py" 1
+python monitor.py --daemon 1
@@ -0,0 +1,62 @@
+import fcntl
+import os
+import threading
+from typing import Optional
+
+# main.py's exit status when it skipped its cycle because another process was running one (EX_TEMPFAIL)
+BUSY_EXIT_CODE = 75
+
+
+class FileLock:
+    """Exclusive flock(2) on `path`, so only one process (and one thread in it) holds it at a time.
+
+    The kernel releases it when the holder exits, so a crashed or killed run never leaves it stuck.
+    The holder writes its pid into the file, for messages about who has it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self, blocking=True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            file = open(self.path, "a+")
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                self._thread_lock.release()
+                return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        file.truncate(0)
+        file.write(str(os.getpid()))
+        file.flush()
+        self._file = file
+        return True
+
+    def release(self):
+        file, self._file = self._file, None
+        fcntl.flock(file, fcntl.LOCK_UN)
+        file.close()
+        self._thread_lock.release()
+
+    def holder(self) -> Optional[int]:
+        """Pid of the process that last took the lock, if it wrote one."""
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,87 @@
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+HOUR = 3600
+# Set by `monitor.py "python main.py" N` to a file where main.py writes how many API requests its cycle sent,
+# so the hourly budget also applies when each cycle is a separate process
+REQUEST_COUNT_ENV = "DPS_REQUEST_COUNT_FILE"
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class PollScheduler:
+    """Decides how long to wait before the next cycle.
+
+    Waits `interval` seconds after a success, backs off exponentially (up to `max_backoff`) after
+    consecutive failures, never polls sooner than a server's Retry-After, and spaces cycles so the
+    requests sent in any hour stay within `max_requests_per_hour`.
+    """
+
+    def __init__(self, interval, max_requests_per_hour=None, max_backoff=HOUR):
+        self.interval = interval
+        self.max_requests_per_hour = max_requests_per_hour
+        self.max_backoff = max(max_backoff, interval)
+        self.failures = 0
+        self.retry_after = None
+        self.paused = False
+        self._sent = deque()  # (timestamp, request count) per cycle in the last hour
+        self._last_cycle_requests = 0
+
+    def set_limits(self, max_requests_per_hour=None, max_backoff=HOUR):
+        self.max_requests_per_hour = max_requests_per_hour
+        self.max_backoff = max(max_backoff, self.interval)
+
+    def record_requests(self, count, now=None):
+        now = time.time() if now is None else now
+        self._sent.append((now, count))
+        self._last_cycle_requests = count
+
+    def success(self):
+        self.failures = 0
+        self.retry_after = None
+
+    def failure(self, retry_after=None):
+        self.failures += 1
+        self.retry_after = retry_after
+
+    def pause(self):
+        """Stop polling altogether, e.g. once the current booking is within range."""
+        self.paused = True
+
+    def next_delay(self, now=None) -> float:
+        now = time.time() if now is None else now
+        delay = self.interval
+        if self.failures:
+            delay = min(self.interval * 2**self.failures, self.max_backoff)
+        if self.retry_after:
+            delay = max(delay, self.retry_after)
+
+        if self.max_requests_per_hour:
+            while self._sent and self._sent[0][0] <= now - HOUR:
+                self._sent.popleft()
+            # Spread the budget evenly: a cycle of n requests may run at most budget / n times an hour
+            if self._last_cycle_requests:
+                delay = max(delay, HOUR * self._last_cycle_requests / self.max_requests_per_hour)
+            # Hard cap: wait for enough of the last hour's requests to age out
+            sent = sum(count for _, count in self._sent)
+            expected = sent + self._last_cycle_requests
+            for timestamp, count in self._sent:
+                if expected <= self.max_requests_per_hour:
+                    break
+                expected -= count
+                delay = max(delay, timestamp + HOUR - now)
+        return delay
@@ -0,0 +1,101 @@
+import base64
+import json
+import os
+import time
+from typing import Optional
+
+from fileutil import atomic_write_json
+
+
+def jwt_expiry(token) -> Optional[float]:
+    """Return the `exp` claim of a (Bearer) JWT as a Unix timestamp, or None if the token isn't a JWT."""
+    try:
+        parts = token.split(" ")[-1].split(".")
+        if len(parts) != 3:
+            return None
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class TokenManager:
+    """Tracks the auth token's issue time and expiry, and persists it atomically.
+
+    Expiry comes from the JWT `exp` claim when there is one. Otherwise it is learned: when a token is
+    rejected, the time between its issue and its last accepted use is a lower bound on the lifetime, and
+    the largest such bound seen is stored and applied to later tokens.
+    """
+
+    def __init__(self, path="auth_token.json"):
+        self.path = path
+        self.token = None
+        self.issued_at = None
+        self.observed_lifetime = None
+        self.last_accepted_at = None
+        self.load()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except ValueError:  # Corrupt file from an older, non-atomic write; log in again
+            return None
+
+    def load(self):
+        data = self._read()
+        if data is None:
+            return
+        self.token = data.get("auth_token")
+        # Files written before expiry tracking only have the token; their mtime is the best issue time we have
+        self.issued_at = data.get("issued_at") or os.path.getmtime(self.path)
+        self.observed_lifetime = data.get("observed_lifetime")
+
+    def save(self):
+        atomic_write_json(
+            self.path,
+            {
+                "auth_token": self.token,
+                "issued_at": self.issued_at,
+                "observed_lifetime": self.observed_lifetime,
+            },
+        )
+
+    def set_token(self, token):
+        self.token = token
+        self.issued_at = time.time()
+        self.last_accepted_at = None
+        self.save()
+
+    def mark_accepted(self):
+        self.last_accepted_at = time.time()
+
+    def mark_rejected(self):
+        if self.issued_at is None or self.last_accepted_at is None or jwt_expiry(self.token) is not None:
+            return
+        # The token expired somewhere after its last accepted use, so that age is a lower bound on the lifetime
+        self.observed_lifetime = max(self.observed_lifetime or 0, self.last_accepted_at - self.issued_at)
+        data = self._read() or {}
+        if data.get("auth_token") not in (None, self.token):
+            # Another process has saved a newer token since; keep it and only add what was learned
+            data["observed_lifetime"] = max(data.get("observed_lifetime") or 0, self.observed_lifetime)
+            atomic_write_json(self.path, data)
+        else:
+            self.save()
+
+    def expires_at(self) -> Optional[float]:
+        if self.token is None:
+            return None
+        exp = jwt_expiry(self.token)
+        if exp is not None:
+            return exp
+        if self.issued_at is not None and self.observed_lifetime is not None:
+            return self.issued_at + self.observed_lifetime
+        return None
+
+    def expires_within(self, seconds) -> bool:
+        expires_at = self.expires_at()
+        return expires_at is not None and expires_at - time.time() <= seconds